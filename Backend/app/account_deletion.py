@@ -0,0 +1,225 @@
+"""
+Background account deletion.
+
+DELETE /api/profile/me removes the user record at once, so the account can no
+longer be used, and queues a job that cascades to the user's sessions,
+messages, search index, stats, profile pictures and rate-limit state. Jobs run
+one at a time on a worker thread and report progress by job id.
+
+Job state lives in a small SQLite database so every gunicorn worker can answer
+status queries. Each worker also watches it for jobs submitted elsewhere and
+drops the deleted user's sessions from its own memory (see watch).
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from app.components import component
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DELETION_DB_PATH = os.getenv("DELETION_DB_PATH", "deletions.db")
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 1000
+# How often each worker looks for accounts deleted by other workers
+DELETION_POLL_SECONDS = float(os.getenv("DELETION_POLL_SECONDS", "5"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+deletions_total = registry.counter(
+    "account_deletions_total", "Account deletion jobs by final state", ("state",))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    sessions_total INTEGER,
+    sessions_deleted INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT
+)
+"""
+
+
+class DeletionJob:
+    __slots__ = ("id", "user_id", "state", "sessions_total", "sessions_deleted",
+                 "created_at", "finished_at", "error")
+
+    def __init__(self, user_id: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.state = QUEUED
+        self.sessions_total = None
+        self.sessions_deleted = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self.error = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        (job.id, job.user_id, job.state, job.sessions_total, job.sessions_deleted,
+         job.created_at, job.finished_at, job.error) = row
+        return job
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "sessions_total": self.sessions_total,
+            "sessions_deleted": self.sessions_deleted,
+            "error": self.error
+        }
+
+
+class SqliteDeletionJobs:
+    """Deletion jobs by id, in submission order (seq) for workers catching up"""
+
+    def __init__(self, path: str = DELETION_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._connect().execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, job: DeletionJob):
+        self._connect().execute(
+            "INSERT INTO jobs (id, user_id, state, sessions_total, sessions_deleted, created_at, finished_at, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET state = excluded.state, "
+            "sessions_total = excluded.sessions_total, sessions_deleted = excluded.sessions_deleted, "
+            "finished_at = excluded.finished_at, error = excluded.error",
+            (job.id, job.user_id, job.state, job.sessions_total, job.sessions_deleted,
+             job.created_at, job.finished_at, job.error)
+        )
+
+    def get(self, job_id: str) -> Optional[DeletionJob]:
+        row = self._connect().execute(
+            "SELECT id, user_id, state, sessions_total, sessions_deleted, created_at, finished_at, error "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return DeletionJob.from_row(row) if row else None
+
+    def since(self, seq: int) -> List[tuple]:
+        """(seq, job id, user id, created_at) of jobs submitted after seq"""
+        return self._connect().execute(
+            "SELECT seq, id, user_id, created_at FROM jobs WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+
+    def prune(self, keep: int = MAX_FINISHED_JOBS):
+        """Forget all but the latest keep finished jobs"""
+        self._connect().execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND seq NOT IN "
+            "(SELECT seq FROM jobs WHERE finished_at IS NOT NULL ORDER BY seq DESC LIMIT ?)", (keep,)
+        )
+
+
+class AccountDeletionQueue:
+    def __init__(self, path: str = DELETION_DB_PATH):
+        self.store = SqliteDeletionJobs(path)
+        self._lock = threading.Lock()
+        # Created on first submit, so a process forked after import gets its own
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Ids of jobs submitted by this process, which the watcher skips
+        self._own = set()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def submit(self, user_id: str, steps: List[Callable[[DeletionJob], None]]) -> DeletionJob:
+        """Queue steps to run in order for user_id; each receives the job to report progress on"""
+        job = DeletionJob(user_id)
+        with self._lock:
+            self._own.add(job.id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="account-deletion")
+            executor = self._executor
+        self.store.save(job)
+        executor.submit(self._run, job, steps)
+        return job
+
+    def report(self, job: DeletionJob):
+        """Publish a job's progress to every worker"""
+        try:
+            self.store.save(job)
+        except sqlite3.Error as e:
+            logger.error(f"Deletion job store error, progress of {job.id} not saved: {e}")
+
+    def _run(self, job: DeletionJob, steps):
+        job.state = RUNNING
+        self.report(job)
+        try:
+            for step in steps:
+                step(job)
+            job.state = DONE
+            logger.info(f"Deleted account {job.user_id} ({job.sessions_deleted} sessions)")
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+            logger.error(f"Account deletion for {job.user_id} failed: {e}", exc_info=True)
+        job.finished_at = time.time()
+        deletions_total.inc(1, job.state)
+        self.report(job)
+        try:
+            self.store.prune()
+        except sqlite3.Error as e:
+            logger.error(f"Deletion job store error, old jobs kept: {e}")
+
+    def find(self, job_id: str) -> Optional[DeletionJob]:
+        return self.store.get(job_id)
+
+    def watch(self, on_deleted: Callable[[str, float], None], interval: float = DELETION_POLL_SECONDS):
+        """
+        Call on_deleted(user_id, created_at) for every job submitted by another worker,
+        starting with those still on record, so this worker forgets state it holds
+        for accounts deleted elsewhere. Started by the app's lifespan in each worker.
+        """
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(on_deleted, interval),
+                                             name="account-deletion-watch", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, on_deleted, interval):
+        seq = 0
+        while True:
+            try:
+                for job_seq, job_id, user_id, created_at in self.store.since(seq):
+                    if job_id not in self._own:
+                        on_deleted(user_id, created_at)
+                    seq = job_seq
+            except Exception as e:
+                # seq stops at the last job handled, so the failed one is retried
+                logger.error(f"Applying account deletions from other workers failed: {e}", exc_info=True)
+            if self._stop.wait(interval):
+                return
+
+    def drain(self):
+        """Finish queued jobs, so a restart doesn't leave orphaned sessions behind"""
+        self._stop.set()
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+deletion_queue = component("deletion_queue", AccountDeletionQueue)
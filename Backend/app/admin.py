@@ -0,0 +1,94 @@
+"""
+Admin-only diagnostics: sampling profiles, memory snapshot diffs.
+
+Profiling and tracemalloc act on the worker that receives the request;
+under gunicorn, repeat the call or look at the worker pid in the response.
+Finished profiles are shared through PROFILE_DIR, so any worker can list and
+download them. Request spans need no endpoint: send X-Trace: 1 with any
+request as an admin and read the Server-Timing response header.
+"""
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+
+from app.auth import get_admin_user
+from app import profiling
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(get_admin_user)])
+
+
+@router.post("/profile/start")
+async def start_profile(
+    seconds: float = Query(30, gt=0, le=profiling.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(profiling.PROFILE_INTERVAL_MS, ge=1, le=1000)
+):
+    """Sample this worker's stacks for the given number of seconds"""
+    profiler = profiling.start_profile(seconds, interval_ms)
+    if profiler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    return {"profile_id": profiler.id, "pid": os.getpid(), "seconds": profiler.seconds,
+            "status_url": f"/api/admin/profile/{profiler.id}"}
+
+
+@router.post("/profile/stop")
+async def stop_profile():
+    """Stop this worker's running profile early and save it"""
+    profiler = profiling.stop_profile()
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="No profile is running in this worker")
+    return {"profile_id": profiler.id, "samples": profiler.samples}
+
+
+@router.get("/profile")
+async def list_profiles():
+    running = profiling.running_profile()
+    return {
+        "running": {"profile_id": running.id, "pid": os.getpid(), "samples": running.samples} if running else None,
+        "profiles": profiling.list_profiles()
+    }
+
+
+@router.get("/profile/{profile_id}")
+async def get_profile(profile_id: str, format: str = Query("collapsed", pattern="^(collapsed|svg)$")):
+    """A finished profile as collapsed stacks (for flamegraph.pl or speedscope) or an SVG flame graph"""
+    collapsed = profiling.read_profile(profile_id)
+    if collapsed is None:
+        running = profiling.running_profile()
+        if running is not None and running.id == profile_id:
+            raise HTTPException(status_code=409, detail="Profile is still running")
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "svg":
+        return Response(profiling.render_flamegraph(collapsed, title=f"Profile {profile_id}"),
+                        media_type="image/svg+xml")
+    return PlainTextResponse(collapsed, headers={
+        "Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'
+    })
+
+
+@router.post("/memory/start")
+async def start_tracemalloc(frames: int = Query(profiling.TRACEMALLOC_FRAMES, ge=1, le=100)):
+    """Start tracing allocations in this worker; slows it down noticeably while on"""
+    profiling.start_tracemalloc(frames)
+    return {"tracing": True, "pid": os.getpid()}
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(
+    limit: int = Query(25, ge=1, le=500),
+    path_filter: str = Query(None, description='e.g. "session_manager" or "retriever"'),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Snapshot and diff against this worker's previous snapshot (the first one sets the baseline)"""
+    try:
+        report = profiling.memory_diff(limit, path_filter, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    report["pid"] = os.getpid()
+    return report
+
+
+@router.post("/memory/stop")
+async def stop_tracemalloc():
+    profiling.stop_tracemalloc()
+    return {"tracing": False, "pid": os.getpid()}
@@ -1,21 +1,41 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import RedirectResponse, StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import Optional
 from app.agent import IslamicAgent
-from app.session_manager import SessionManager
-from app.auth import create_access_token, get_current_user, user_db
+from app.session_manager import SessionManager, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.session_transfer import export_ndjson, import_ndjson, iter_lines, ImportFormatError
+from app.auth import (
+    create_access_token, get_current_user, user_db,
+    GOOGLE_AUTH_URL, GOOGLE_TOKEN_URL, GOOGLE_USERINFO_URL
+)
+from app.http_client import get_client
+from app.rate_limit import AdmissionControl, ADMITTED, THROTTLED, fallback_answers_total
+from app.scheduler import scheduler, RequestDropped
+from app.components import component
+from app.responses import versioned_json
+from app.profiling import span
+from app.post_response import post_tasks
+from app.metrics import registry
 from datetime import datetime, timedelta
+import asyncio
 import logging
-import httpx
 import os
+import time
 # Environment variables are now loaded in main.py
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize agent and session manager
-agent = IslamicAgent()
-session_manager = SessionManager()
+# Longest a question may wait for a generation slot before it is dropped
+ASK_QUEUE_TIMEOUT = float(os.getenv("ASK_QUEUE_TIMEOUT", "30"))
+
+ask_durable_lag = registry.histogram(
+    "ask_durable_lag_seconds", "Delay between answering a question and the exchange being written to disk")
+
+# Built by the app's lifespan, or on first use
+agent = component("agent", IslamicAgent)
+session_manager = component("session_manager", SessionManager)
+admission = component("admission", AdmissionControl)
 
 class QuestionRequest(BaseModel):
     question: str
@@ -34,7 +54,7 @@ async def google_login():
         return {"error": "Google OAuth is not configured"}
     
     google_auth_url = (
-        f"https://accounts.google.com/o/oauth2/v2/auth"
+        f"{GOOGLE_AUTH_URL}"
         f"?client_id={client_id}"
         f"&redirect_uri={redirect_uri}"
         f"&response_type=code"
@@ -68,79 +88,77 @@ async def google_callback(request: Request, code: str = None, error: str = None)
             "grant_type": "authorization_code",
         }
         
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data=token_data
-            )
-            
-            if token_response.status_code != 200:
-                logger.error(f"Token exchange failed: {token_response.status_code}")
-                frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-                return RedirectResponse(url=f"{frontend_url}/login?error=token_exchange_failed")
-            
-            token_json = token_response.json()
-            access_token = token_json.get("access_token")
-            
-            # Get user info
-            user_response = await client.get(
-                "https://www.googleapis.com/oauth2/v2/userinfo",
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
-            
-            if user_response.status_code != 200:
-                logger.error(f"Failed to get user info: {user_response.status_code}")
-                frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-                return RedirectResponse(url=f"{frontend_url}/login?error=user_info_failed")
-            
-            user_info = user_response.json()
-            email = user_info['email']
-            name = user_info.get('name', email.split('@')[0])
-            picture = user_info.get('picture', '')
-            
-            # Check if user exists
-            user = user_db.get_user(email)
-            
-            if not user:
-                # Create new user
-                user = {
-                    "email": email,
-                    "name": name,
-                    "picture": picture,
-                    "google_id": user_info.get('id', ''),
-                    "created_at": datetime.now().isoformat(),
-                    "last_login": datetime.now().isoformat(),
-                    "preferences": {},
-                    "settings": {
-                        "theme": "light",
-                        "language": "en",
-                        "notifications": True,
-                        "font_size": "medium"
-                    }
-                }
-                user_db.create_user(email, user)
-                logger.info(f"✅ New user created: {email}")
-            else:
-                # Update existing user
-                user["name"] = name
-                user["picture"] = picture
-                user["last_login"] = datetime.now().isoformat()
-                user_db.update_user(email, user)
-                logger.info(f"✅ Existing user logged in: {email}")
-            
-            # Create JWT token
-            access_token_expires = timedelta(minutes=30)
-            jwt_token = create_access_token(
-                data={"sub": email},
-                expires_delta=access_token_expires
-            )
-            
-            # Redirect to frontend with token
+        client = get_client()
+        token_response = await client.post(GOOGLE_TOKEN_URL, data=token_data)
+        
+        if token_response.status_code != 200:
+            logger.error(f"Token exchange failed: {token_response.status_code}")
             frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-            return RedirectResponse(
-                url=f"{frontend_url}/auth/callback?token={jwt_token}"
-            )
-            
+            return RedirectResponse(url=f"{frontend_url}/login?error=token_exchange_failed")
+        
+        token_json = token_response.json()
+        access_token = token_json.get("access_token")
+        
+        # Get user info
+        user_response = await client.get(
+            GOOGLE_USERINFO_URL,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        
+        if user_response.status_code != 200:
+            logger.error(f"Failed to get user info: {user_response.status_code}")
+            frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
+            return RedirectResponse(url=f"{frontend_url}/login?error=user_info_failed")
+        
+        user_info = user_response.json()
+        email = user_info['email']
+        name = user_info.get('name', email.split('@')[0])
+        picture = user_info.get('picture', '')
+        
+        # Check if user exists
+        user = user_db.get_user(email)
+        
+        if not user:
+            # Create new user
+            user = {
+                "email": email,
+                "name": name,
+                "picture": picture,
+                "google_id": user_info.get('id', ''),
+                "created_at": datetime.now().isoformat(),
+                "last_login": datetime.now().isoformat(),
+                "preferences": {},
+                "settings": {
+                    "theme": "light",
+                    "language": "en",
+                    "notifications": True,
+                    "font_size": "medium"
+                }
+            }
+            await asyncio.to_thread(user_db.create_user, email, user)
+            logger.info(f"✅ New user created: {email}")
+        else:
+            # Refresh login metadata; buffered so a burst of logins is one write
+            user_db.record_login(email, {
+                "name": name,
+                "picture": picture,
+                "last_login": datetime.now().isoformat()
+            })
+            logger.info(f"✅ Existing user logged in: {email}")
+        
+        # Create JWT token
+        access_token_expires = timedelta(minutes=30)
+        jwt_token = create_access_token(
+            data={"sub": email},
+            expires_delta=access_token_expires
+        )
+        
+        # Redirect to frontend with token
+        frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
+        return RedirectResponse(
+            url=f"{frontend_url}/auth/callback?token={jwt_token}"
+        )
+        
     except Exception as e:
         logger.error(f"Google auth error: {str(e)}", exc_info=True)
         frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -153,12 +171,15 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 
 # Session routes
 @router.get("/sessions")
-async def get_sessions(current_user: dict = Depends(get_current_user)):
+async def get_sessions(request: Request, current_user: dict = Depends(get_current_user)):
     """Get all sessions for current user"""
     try:
         user_id = current_user["email"]
-        sessions = session_manager.get_all_sessions(user_id=user_id)
-        return {"sessions": sessions}
+        await post_tasks.settled(user_id)
+        return await versioned_json(
+            request, ("sessions", user_id), session_manager.user_versions.get(user_id, 0),
+            lambda: {"sessions": session_manager.get_all_sessions(user_id=user_id)}
+        )
     except Exception as e:
         logger.error(f"Error getting sessions: {e}")
         return {"sessions": []}
@@ -168,21 +189,80 @@ async def create_session(current_user: dict = Depends(get_current_user)):
     """Create a new session"""
     try:
         user_id = current_user["email"]
-        session_id = session_manager.create_session(user_id=user_id)
+        session_id = await asyncio.to_thread(session_manager.create_session, user_id=user_id)
         return {"session_id": session_id}
     except Exception as e:
         logger.error(f"Error creating session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sessions/search")
+async def search_sessions(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Search the current user's conversation history"""
+    try:
+        user_id = current_user["email"]
+        await post_tasks.settled(user_id)
+        # The first search builds the user's index from their stored messages
+        results = await asyncio.to_thread(session_manager.search, user_id, q, limit=limit)
+        return {"query": q, "results": results}
+    except Exception as e:
+        logger.error(f"Error searching sessions: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/sessions/export")
+async def export_sessions(current_user: dict = Depends(get_current_user)):
+    """Stream all of the current user's sessions and messages as NDJSON"""
+    user_id = current_user["email"]
+    filename = f"sessions-{datetime.now().strftime('%Y%m%d')}.ndjson"
+    return StreamingResponse(
+        export_ndjson(session_manager, user_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/sessions/import")
+async def import_sessions(request: Request, current_user: dict = Depends(get_current_user)):
+    """Import sessions from an NDJSON export (streamed, in batches)"""
+    try:
+        user_id = current_user["email"]
+        return await import_ndjson(session_manager, user_id, iter_lines(request.stream()))
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing sessions: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/sessions/{session_id}")
-async def get_session(session_id: str, current_user: dict = Depends(get_current_user)):
-    """Get specific session with full message history"""
+async def get_session(
+    session_id: str,
+    request: Request,
+    before: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a session with one page of its message history (latest page by default)"""
     try:
         user_id = current_user["email"]
+        await post_tasks.settled(session_id)
         session = session_manager.get_session(session_id, user_id=user_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        return session.to_full_dict()
+        
+        def page():
+            messages, next_before = session_manager.get_message_page(
+                session_id, user_id=user_id, before=before, limit=limit
+            )
+            return {
+                **session.to_dict(),
+                "messages": messages,
+                "has_more": next_before is not None,
+                "next_before": next_before
+            }
+        
+        return await versioned_json(request, ("session", session_id, before, limit), session.version, page)
     except HTTPException:
         raise
     except Exception as e:
@@ -208,30 +288,61 @@ async def delete_session(session_id: str, current_user: dict = Depends(get_curre
 @router.post("/ask")
 async def ask_question(
     req: QuestionRequest,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Ask a question"""
+    user_id = current_user["email"]
+    # Explicit Quran/hadith lookups and frequently asked questions are answered without
+    # a model call, so they skip admission and the generation queue
+    with span("instant"):
+        answer = agent.instant_answer(req.question)
+    if answer is None:
+        with span("admission"):
+            # The bucket transaction can wait on other workers' locks; keep it off the event loop
+            outcome, retry_after = await asyncio.to_thread(admission.admit, user_id)
+        if outcome != ADMITTED:
+            return _refuse_question(req, outcome, retry_after)
+    
     try:
-        user_id = current_user["email"]
         logger.info(f"Question from {user_id}: {req.question[:50]}...")
         
-        # Create new session if none provided
-        if not req.session_id:
-            session_id = session_manager.create_session(user_id=user_id)
-        else:
-            session_id = req.session_id
-            if not session_manager.get_session(session_id, user_id=user_id):
-                session_id = session_manager.create_session(user_id=user_id)
-        
-        # Get conversation history
-        conversation_history = session_manager.get_messages(session_id, user_id=user_id, limit=10)
+        with span("session"):
+            # Create new session if none provided
+            if not req.session_id:
+                session_id = await asyncio.to_thread(session_manager.create_session, user_id=user_id)
+            else:
+                session_id = req.session_id
+                if not session_manager.get_session(session_id, user_id=user_id):
+                    session_id = await asyncio.to_thread(session_manager.create_session, user_id=user_id)
         
-        # Get answer from agent with context
-        answer = await agent.answer_question(req.question, conversation_history)
+        if answer is None:
+            # Get conversation history
+            with span("history"):
+                # The previous turn may still be on its way to storage
+                await post_tasks.settled(session_id)
+                conversation_history = await asyncio.to_thread(
+                    session_manager.get_messages, session_id, user_id=user_id, limit=10
+                )
+            
+            # Get answer from agent with context, once the scheduler grants a generation slot
+            try:
+                async with scheduler.slot(user_id, timeout=ASK_QUEUE_TIMEOUT,
+                                          is_disconnected=request.is_disconnected):
+                    answer = await agent.answer_question(req.question, conversation_history)
+            except RequestDropped:
+                return JSONResponse(
+                    status_code=503,
+                    headers={"Retry-After": "5"},
+                    content={"detail": "The service is busy right now. Please try again shortly.", "session_id": session_id}
+                )
         
-        # Save to session history
-        session_manager.add_message(session_id, "user", req.question, user_id=user_id)
-        session_manager.add_message(session_id, "bot", answer, user_id=user_id)
+        # Save to session history once the answer is on its way
+        await post_tasks.submit(
+            "save_exchange", _save_exchange, session_id, user_id,
+            [("user", req.question), ("bot", answer)], time.monotonic(),
+            keys=(session_id, user_id)
+        )
         
         return {
             "answer": answer,
@@ -242,46 +353,34 @@ async def ask_question(
         logger.error(f"Error processing question: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-# Profile routes
-@router.get("/profile/me")
-async def get_profile(current_user: dict = Depends(get_current_user)):
-    """Get user profile"""
-    return current_user
-
-@router.get("/profile/stats")
-async def get_stats(current_user: dict = Depends(get_current_user)):
-    """Get user stats"""
-    user_id = current_user["email"]
-    sessions = session_manager.get_all_sessions(user_id=user_id)
-    total_chats = len(sessions)
-    total_messages = sum(s.get("message_count", 0) for s in sessions)
-    
-    return {
-        "total_chats": total_chats,
-        "total_messages": total_messages,
-        "favorite_topics": ["Prayer", "Fasting", "Zakat", "Hajj", "Quran"],
-        "joined_date": current_user.get("created_at", datetime.now().isoformat()),
-        "last_active": current_user.get("last_login", datetime.now().isoformat())
-    }
+def _save_exchange(session_id: str, user_id: str, messages: list, answered_at: float):
+    """Post-response: store an answered exchange; a retry resumes after the messages already added"""
+    while messages:
+        role, content = messages[0]
+        session_manager.add_message(session_id, role, content, user_id=user_id)
+        messages.pop(0)
+    session_manager.writer.on_durable(lambda: ask_durable_lag.observe(time.monotonic() - answered_at))
 
-@router.put("/profile/me")
-async def update_profile(
-    profile_data: dict,
-    current_user: dict = Depends(get_current_user)
-):
-    """Update user profile"""
-    email = current_user["email"]
-    user = user_db.get_user(email)
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if "name" in profile_data:
-        user["name"] = profile_data["name"]
-    if "preferences" in profile_data:
-        user["preferences"] = profile_data["preferences"]
-    
-    user_db.update_user(email, user)
-    return user
+def _refuse_question(req: QuestionRequest, outcome: str, retry_after: float):
+    """429 for a question over its limit, carrying a cached or local answer when one exists"""
+    source, answer = "cache", agent.cached_answer(req.question)
+    if answer is None:
+        source, answer = "local", agent.local_answer(req.question)
+    if answer is not None:
+        fallback_answers_total.inc(1, source)
+    detail = ("You're asking questions too quickly" if outcome == THROTTLED
+              else "The service is busy right now")
+    seconds = max(1, int(retry_after + 0.999))
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(seconds)},
+        content={
+            "detail": f"{detail}. Please try again in {seconds} seconds.",
+            "retry_after": seconds,
+            "answer": answer,
+            "answer_source": source if answer is not None else None,
+            "session_id": req.session_id
+        }
+    )
 
 # End of router routes
\ No newline at end of file
@@ -6,10 +6,17 @@ import json
 import hashlib
 import base64
 import hmac
-from fastapi import Depends, HTTPException, status, Request
+from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-import httpx
 import logging
+import threading
+import time
+from collections import OrderedDict
+from app.components import component
+from app.metrics import registry
+from app.persistence import WriteBehindWriter
+from app.profiling import authorize_trace, span
+from app.user_store import SqliteUserStore, USERS_DB_PATH
 
 logger = logging.getLogger(__name__)
 
@@ -18,12 +25,48 @@ SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Verified tokens kept in memory so repeat requests skip HMAC and payload decoding
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+# User records cached per process; the TTL bounds staleness after another worker's update
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+# Login metadata (last_login, name, picture) is buffered this long so a login storm
+# becomes one transaction; account and profile changes are written immediately
+LOGIN_FLUSH_INTERVAL = float(os.getenv("LOGIN_FLUSH_INTERVAL", "5"))
+
+# Comma-separated emails allowed to use the /api/admin diagnostics
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
 # Google OAuth settings
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
 
+# Local stand-in for Google's OAuth endpoints (app/fake_oauth.py), for offline load tests
+FAKE_OAUTH = os.getenv("FAKE_OAUTH", "").lower() in ("1", "true", "yes")
+_oauth_base = (
+    f"{os.getenv('BACKEND_URL', 'http://localhost:8000').rstrip('/')}/api/fake-oauth" if FAKE_OAUTH else None
+)
+GOOGLE_AUTH_URL = os.getenv(
+    "GOOGLE_AUTH_URL", f"{_oauth_base}/authorize" if FAKE_OAUTH else "https://accounts.google.com/o/oauth2/v2/auth")
+GOOGLE_TOKEN_URL = os.getenv(
+    "GOOGLE_TOKEN_URL", f"{_oauth_base}/token" if FAKE_OAUTH else "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = os.getenv(
+    "GOOGLE_USERINFO_URL", f"{_oauth_base}/userinfo" if FAKE_OAUTH else "https://www.googleapis.com/oauth2/v2/userinfo")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
+cache_hits_total = registry.counter(
+    "cache_hits_total", "Cache lookups that found an entry", ("cache",))
+cache_misses_total = registry.counter(
+    "cache_misses_total", "Cache lookups that missed", ("cache",))
+user_writes_avoided_total = registry.counter(
+    "user_writes_avoided_total", "User record changes folded into another change's transaction")
+
+# token -> verified claims, least recently used first. Keyed by the whole token rather
+# than the signature alone so a valid signature can't be paired with another payload.
+_token_cache: "OrderedDict[str, dict]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
 # Simple JWT implementation
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a simple JWT token"""
@@ -49,7 +92,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return f"{header}.{payload}.{signature}"
 
 def decode_token(token: str):
-    """Decode a JWT token"""
+    """Decode a JWT token, using the verified-token cache when possible"""
+    with _token_cache_lock:
+        claims = _token_cache.get(token)
+        if claims is not None:
+            if claims.get("exp", 0) < datetime.utcnow().timestamp():
+                del _token_cache[token]
+                return None
+            _token_cache.move_to_end(token)
+    if claims is not None:
+        cache_hits_total.inc(1, "token")
+        return claims
+    cache_misses_total.inc(1, "token")
+    claims = _verify_token(token)
+    if claims is not None and TOKEN_CACHE_SIZE > 0:
+        with _token_cache_lock:
+            _token_cache[token] = claims
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return claims
+
+def _verify_token(token: str):
+    """Verify a JWT token's signature and expiry and return its claims"""
     try:
         parts = token.split(".")
         if len(parts) != 3:
@@ -91,7 +155,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    payload = decode_token(token)
+    with span("auth"):
+        payload = decode_token(token)
     if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -109,7 +174,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     
     # Get user from database
     from app.auth import user_db
-    user = user_db.get_user(email)
+    with span("user_lookup"):
+        user = user_db.get_user(email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -117,38 +183,121 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    authorize_trace(is_admin(email))
     return user
 
+def is_admin(email: str) -> bool:
+    return email.lower() in ADMIN_EMAILS
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    """Current user, if listed in ADMIN_EMAILS"""
+    if not is_admin(current_user["email"]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
 # User database
 class UserDB:
-    def __init__(self):
-        self.users_file = "users.json"
-        self.load_users()
+    """
+    User records in SQLite (see app.user_store), one row per email. Account and
+    profile changes are written immediately; login metadata waits in the
+    write-behind queue for up to LOGIN_FLUSH_INTERVAL. Other workers see changes
+    once flushed and their cached copy expires. The immediate writes wait on
+    SQLite, so async handlers call them through asyncio.to_thread.
+    """
+
+    def __init__(self, db_path: str = USERS_DB_PATH, legacy_file: str = "users.json", sync: bool = None):
+        self.store = SqliteUserStore(db_path)
+        self._lock = threading.RLock()
+        # email -> latest record (None if deleted) for changes not yet flushed
+        self._overlay: Dict[str, Optional[dict]] = {}
+        # email -> (loaded_at, record) read from the store, least recently used first
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.writer = WriteBehindWriter("users", self._flush, interval=LOGIN_FLUSH_INTERVAL, sync=sync)
+        self._migrate_legacy(legacy_file)
+    
+    def _migrate_legacy(self, legacy_file: str):
+        """Import users.json on first start against an empty database"""
+        if os.path.exists(legacy_file) and self.store.count() == 0:
+            try:
+                imported = self.store.import_json(legacy_file)
+                logger.info(f"Imported {imported} users from {legacy_file}")
+            except Exception as e:
+                logger.error(f"Error importing {legacy_file}: {e}")
     
-    def load_users(self):
-        try:
-            with open(self.users_file, 'r') as f:
-                self.users = json.load(f)
-        except:
-            self.users = {}
+    def _flush(self, batch: dict):
+        """Writer callback: apply every queued row change in one transaction"""
+        self.store.apply(batch)
+        user_writes_avoided_total.inc(sum(len(ops) for ops in batch.values()) - 1)
+        with self._lock:
+            for email in batch:
+                if not self.writer.has_pending(email):
+                    self._overlay.pop(email, None)
     
-    def save_users(self):
-        with open(self.users_file, 'w') as f:
-            json.dump(self.users, f, indent=2)
+    def _enqueue(self, email: str, action: str, record: Optional[dict], data: Optional[dict] = None,
+                 immediate: bool = True):
+        with self._lock:
+            self._overlay[email] = record
+            self._cache.pop(email, None)
+            self.writer.enqueue(email, (action, data if data is not None else record))
+        if immediate:
+            # Writes everything queued, in order, so buffered login updates never land after this change
+            self.writer.flush()
+        else:
+            self.writer.commit()
+    
+    def flush(self):
+        """Write all pending changes now"""
+        self.writer.flush()
     
     def get_user(self, email: str):
-        return self.users.get(email)
+        with self._lock:
+            if email in self._overlay:
+                record = self._overlay[email]
+                return dict(record) if record is not None else None
+            cached = self._cache.get(email)
+            if cached is not None and time.monotonic() - cached[0] < USER_CACHE_TTL:
+                self._cache.move_to_end(email)
+                cache_hits_total.inc(1, "user")
+                return dict(cached[1])
+        cache_misses_total.inc(1, "user")
+        loaded_at = time.monotonic()
+        record = self.store.get(email)
+        if record is not None and USER_CACHE_SIZE > 0:
+            with self._lock:
+                # Skip caching if the user changed while we were reading
+                if email not in self._overlay:
+                    self._cache[email] = (loaded_at, record)
+                    self._cache.move_to_end(email)
+                    while len(self._cache) > USER_CACHE_SIZE:
+                        self._cache.popitem(last=False)
+            return dict(record)
+        return record
     
     def create_user(self, email: str, user_data: dict):
-        self.users[email] = user_data
-        self.save_users()
+        self._enqueue(email, "put", dict(user_data))
         return user_data
     
     def update_user(self, email: str, user_data: dict):
-        if email in self.users:
-            self.users[email].update(user_data)
-            self.save_users()
-            return self.users[email]
-        return None
+        user = self.get_user(email)
+        if user is None:
+            return None
+        user.update(user_data)
+        self._enqueue(email, "patch", user, dict(user_data))
+        return user
+    
+    def record_login(self, email: str, login_data: dict):
+        """Buffer login-time metadata (last_login, name, picture); flushed in batches"""
+        user = self.get_user(email)
+        if user is None:
+            return None
+        user.update(login_data)
+        self._enqueue(email, "patch", user, dict(login_data), immediate=False)
+        return user
+    
+    def delete_user(self, email: str):
+        if self.get_user(email) is None:
+            return False
+        self._enqueue(email, "delete", None)
+        return True
 
-user_db = UserDB()
\ No newline at end of file
+user_db = component("user_db", UserDB)
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Profile picture storage.
+
+Uploads are identified by sniffing their first bytes rather than trusting the
+client's filename or content type. Downscaled variants are generated in a
+process pool after the upload has been answered, when Pillow is installed;
+without it the original is served for every size. This module stays free of
+app imports so pool workers can load it cheaply.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PICS_DIR = os.getenv("PROFILE_PICS_DIR", "profile_pics")
+MAX_AVATAR_BYTES = int(os.getenv("MAX_AVATAR_BYTES", str(5 * 1024 * 1024)))
+# Square edge lengths, in pixels, of the variants generated for each upload
+AVATAR_SIZES = tuple(int(s) for s in os.getenv("AVATAR_SIZES", "64,256").split(","))
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))
+# Picture URLs carry a content version, so responses can be cached for a year
+AVATAR_MAX_AGE = 365 * 24 * 3600
+# Cache lifetime of the original served in place of a variant that doesn't exist yet
+AVATAR_FALLBACK_MAX_AGE = 60
+
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+AVATAR_NAME_RE = re.compile(r"^[0-9a-f]{16}(\.\d+)?\.(jpg|png|gif|webp)$")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """File extension for the image type whose signature head starts with, if any"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def avatar_stem(email: str) -> str:
+    """Per-user file stem that doesn't expose the email address in public URLs"""
+    return hashlib.sha256(email.lower().encode()).hexdigest()[:16]
+
+
+def variant_path(path: str, size: int) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{size}{ext}"
+
+
+def pick_variant(path: str, size: int) -> str:
+    """Smallest generated variant at least size pixels wide, else the original"""
+    for candidate in sorted(AVATAR_SIZES):
+        if candidate >= size:
+            variant = variant_path(path, candidate)
+            if os.path.exists(variant):
+                return variant
+            break
+    return path
+
+
+def wants_variant(size: int) -> bool:
+    """Whether a request for size would be served a variant once it has been generated"""
+    return Image is not None and any(candidate >= size for candidate in AVATAR_SIZES)
+
+
+def remove_avatars(stem: str, keep: str = None):
+    """Delete a user's stored pictures and variants, except keep"""
+    if not os.path.isdir(PROFILE_PICS_DIR):
+        return
+    for fname in os.listdir(PROFILE_PICS_DIR):
+        path = os.path.join(PROFILE_PICS_DIR, fname)
+        if fname.startswith(stem + ".") and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def make_variants(path: str, sizes=AVATAR_SIZES) -> List[str]:
+    """Write square, downscaled copies of the image at path; runs in a pool worker"""
+    written = []
+    with Image.open(path) as image:
+        image.load()
+        edge = min(image.size)
+        left, top = (image.width - edge) // 2, (image.height - edge) // 2
+        square = image.crop((left, top, left + edge, top + edge))
+        if square.mode not in ("RGB", "RGBA"):
+            square = square.convert("RGBA" if "transparency" in image.info else "RGB")
+        for size in sizes:
+            if size >= edge:
+                continue
+            target = variant_path(path, size)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            variant = square.resize((size, size), Image.LANCZOS)
+            if image.format == "JPEG" and variant.mode != "RGB":
+                variant = variant.convert("RGB")
+            variant.save(tmp, format=image.format, quality=85)
+            os.replace(tmp, target)
+            written.append(target)
+    return written
+
+
+def _report(future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Avatar variant generation failed: {error}")
+
+
+def schedule_variants(path: str):
+    """Generate variants for path in the background; a no-op without Pillow"""
+    global _pool
+    if Image is None or not AVATAR_SIZES:
+        return None
+    if _pool is None:
+        # Forking a worker that runs threads can copy a held lock into the child; spawn starts clean
+        _pool = ProcessPoolExecutor(max_workers=AVATAR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    future = _pool.submit(make_variants, path)
+    future.add_done_callback(_report)
+    return future
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,255 @@
+"""
+Content-addressed, compressed storage for long message bodies.
+
+Each distinct text is stored once under its SHA-256, zlib-compressed, and
+optionally primed with a shared dictionary trained on our own answers (the
+greeting, closing and stock phrases every bot answer repeats). Message logs
+then hold only the hash. Decoded texts are cached by hash so identical
+answers share one string object in memory.
+
+References are counted in refs.db next to the blobs, shared by every worker:
+each stored row that points at a blob adds one, and removing the row releases
+it. A blob whose count drops to zero is deleted. Blobs written before counting
+began are never deleted, since rows written back then were not counted.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Optional
+
+# Texts shorter than this are stored inline; a reference would not save anything
+BLOB_MIN_CHARS = int(os.getenv("BLOB_MIN_CHARS", "256"))
+# Upper bound on decoded text kept in the hash -> str cache
+BLOB_CACHE_BYTES = int(float(os.getenv("BLOB_CACHE_MB", "32")) * 1024 * 1024)
+# zlib only uses the last 32 KiB of a preset dictionary
+MAX_DICTIONARY_BYTES = 32 * 1024
+
+REFS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    digest TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+FORMAT_PLAIN = b"\x00"
+FORMAT_DICTIONARY = b"\x01"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_BYTES) -> bytes:
+    """
+    Build a zlib preset dictionary from sample texts: the lines and sentences that
+    recur most often, with the most frequent last since zlib favours nearby matches.
+    """
+    counts = Counter()
+    for text in samples:
+        for line in text.splitlines():
+            line = line.strip()
+            if len(line) < 8:
+                continue
+            counts[line] += 1
+            for sentence in line.split(". "):
+                if len(sentence) >= 8 and sentence != line:
+                    counts[sentence] += 1
+    chosen = []
+    used = 0
+    for phrase, count in counts.most_common():
+        if count < 2:
+            break
+        encoded = phrase.encode("utf-8") + b"\n"
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+class BlobStore:
+    """Deduplicated blobs under root/<aa>/<hash>, with optional shared dictionary"""
+
+    def __init__(self, root: str, cache_bytes: int = BLOB_CACHE_BYTES):
+        self.root = root
+        self.cache_bytes = cache_bytes
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        # dictionary id (adler32) -> dictionary bytes; every dictionary ever used stays readable
+        self.dictionaries: Dict[int, bytes] = {}
+        self.dictionary_id: Optional[int] = None
+        os.makedirs(root, exist_ok=True)
+        self._load_dictionaries()
+        # sqlite3 connections must stay on the thread that opened them
+        self._local = threading.local()
+        # Set up by the first put or release, so a store that is only read never writes
+        self.counted_since: Optional[float] = None
+
+    def _refs(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, "refs.db"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if self.counted_since is None:
+                conn.executescript(REFS_SCHEMA)
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('counted_since', ?)", (time.time(),))
+                self.counted_since = conn.execute(
+                    "SELECT value FROM meta WHERE key = 'counted_since'").fetchone()[0]
+            self._local.conn = conn
+        return conn
+
+    def _load_dictionaries(self):
+        for fname in os.listdir(self.root):
+            if fname.startswith("dict-") and fname.endswith(".bin"):
+                with open(os.path.join(self.root, fname), "rb") as f:
+                    data = f.read()
+                self.dictionaries[zlib.adler32(data)] = data
+        current = os.path.join(self.root, "dictionary.bin")
+        if os.path.exists(current):
+            with open(current, "rb") as f:
+                data = f.read()
+            self.dictionary_id = zlib.adler32(data)
+            self.dictionaries[self.dictionary_id] = data
+
+    def _write(self, path: str, data: bytes):
+        """Write data to path atomically so readers in other workers never see a partial file"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def set_dictionary(self, data: bytes):
+        """Use data as the preset dictionary for new blobs (existing blobs stay readable)"""
+        dictionary_id = zlib.adler32(data)
+        # The id-named copy lands first: any blob compressed with it must be decodable
+        self._write(os.path.join(self.root, f"dict-{dictionary_id}.bin"), data)
+        self._write(os.path.join(self.root, "dictionary.bin"), data)
+        with self._lock:
+            self.dictionaries[dictionary_id] = data
+        self.dictionary_id = dictionary_id
+
+    def _dictionary(self, dictionary_id: int) -> bytes:
+        """Dictionary by id, loading it from disk if another worker installed it after we started"""
+        dictionary = self.dictionaries.get(dictionary_id)
+        if dictionary is not None:
+            return dictionary
+        with open(os.path.join(self.root, f"dict-{dictionary_id}.bin"), "rb") as f:
+            dictionary = f.read()
+        if zlib.adler32(dictionary) != dictionary_id:
+            raise ValueError(f"dictionary {dictionary_id} is corrupt")
+        with self._lock:
+            self.dictionaries[dictionary_id] = dictionary
+        return dictionary
+
+    def _path(self, digest: str):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def compress(self, text: str) -> bytes:
+        raw = text.encode("utf-8")
+        if self.dictionary_id is None:
+            return FORMAT_PLAIN + zlib.compress(raw, 9)
+        compressor = zlib.compressobj(9, zdict=self.dictionaries[self.dictionary_id])
+        return (FORMAT_DICTIONARY + self.dictionary_id.to_bytes(4, "big")
+                + compressor.compress(raw) + compressor.flush())
+
+    def decompress(self, data: bytes) -> str:
+        if data[:1] == FORMAT_DICTIONARY:
+            dictionary = self._dictionary(int.from_bytes(data[1:5], "big"))
+            decompressor = zlib.decompressobj(zdict=dictionary)
+            raw = decompressor.decompress(data[5:]) + decompressor.flush()
+        else:
+            raw = zlib.decompress(data[1:])
+        return raw.decode("utf-8")
+
+    def _remember(self, digest: str, text: str) -> str:
+        """Cache text under digest and return the canonical (shared) string object"""
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                return cached
+            self._cache[digest] = text
+            self._cached_bytes += len(text)
+            while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                _, dropped = self._cache.popitem(last=False)
+                self._cached_bytes -= len(dropped)
+            return text
+
+    def intern(self, text: str) -> str:
+        """Return a shared string object for text if an identical one is already cached"""
+        if len(text) < BLOB_MIN_CHARS:
+            return text
+        return self._remember(content_hash(text), text)
+
+    def put(self, text: str) -> str:
+        """
+        Store text if it is not stored yet, count one more reference to it and return
+        its hash. Each call must end up in exactly one stored row; a call whose row is
+        never written leaks the blob rather than risking it.
+        """
+        digest = content_hash(text)
+        # Counted before the existence check, so a concurrent release can't delete it after
+        self._refs().execute(
+            "INSERT INTO refs (digest, count) VALUES (?, 1) "
+            "ON CONFLICT(digest) DO UPDATE SET count = count + 1",
+            (digest,)
+        )
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write(path, self.compress(text))
+        self._remember(digest, text)
+        return digest
+
+    def get(self, digest: str) -> str:
+        with self._lock:
+            cached = self._cache.get(digest)
+        if cached is not None:
+            return cached
+        with open(self._path(digest), "rb") as f:
+            text = self.decompress(f.read())
+        return self._remember(digest, text)
+
+    def release(self, digests: Iterable[str]):
+        """Drop one reference per digest given, deleting blobs that nothing refers to any more"""
+        counts = Counter(digests)
+        if not counts:
+            return
+        conn = self._refs()
+        # Files are removed inside the transaction, so a put counting a new reference waits
+        # for it and then finds the file gone and writes it again
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for digest, released in counts.items():
+                row = conn.execute("SELECT count FROM refs WHERE digest = ?", (digest,)).fetchone()
+                if row is None:
+                    continue
+                if row[0] > released:
+                    conn.execute("UPDATE refs SET count = ? WHERE digest = ?", (row[0] - released, digest))
+                    continue
+                conn.execute("DELETE FROM refs WHERE digest = ?", (digest,))
+                path = self._path(digest)
+                try:
+                    # Older blobs may still be referenced by rows from before counting began
+                    if os.path.getmtime(path) >= self.counted_since:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+                with self._lock:
+                    dropped = self._cache.pop(digest, None)
+                    if dropped is not None:
+                        self._cached_bytes -= len(dropped)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
@@ -0,0 +1,112 @@
+"""
+Lazily built application singletons.
+
+Modules declare their expensive singletons (the agent, session and user
+stores, the knowledge index) with component() instead of constructing them
+at import time, and keep using them as before: attribute access on a
+component builds it on first use and is then forwarded to the instance.
+
+The app's lifespan builds every component concurrently in threads after
+the worker has started, recording how long each took; /ready reports
+their state. Shared components hold read-only data that is safe to build
+before forking. main.py builds them at import, so under gunicorn --preload
+the master builds them once and workers share the pages copy-on-write.
+Everything else owns threads, files or connections and is only built
+inside a worker.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+init_seconds = registry.gauge(
+    "component_init_seconds", "Time taken to build each application component", ("component",))
+component_ready = registry.gauge(
+    "component_ready", "1 once a component has been built, 0 before or after a failure", ("component",))
+
+_UNSET = object()
+_components: Dict[str, "Component"] = {}
+
+
+class Component:
+    """Proxy that builds its instance with factory() on first use"""
+
+    def __init__(self, name: str, factory: Callable[[], object], shared: bool = False):
+        self._name = name
+        self._factory = factory
+        self._shared = shared
+        self._instance = _UNSET
+        self._lock = threading.Lock()
+        self._seconds = None
+        self._error = None
+        component_ready.set_function(lambda: 1 if self._instance is not _UNSET else 0, name)
+
+    def get(self):
+        instance = self._instance
+        if instance is not _UNSET:
+            return instance
+        with self._lock:
+            if self._instance is _UNSET:
+                started = time.perf_counter()
+                try:
+                    instance = self._factory()
+                except Exception as e:
+                    self._error = str(e)
+                    logger.error(f"Failed to initialize {self._name}: {e}", exc_info=True)
+                    raise
+                self._seconds = time.perf_counter() - started
+                self._error = None
+                self._instance = instance
+                init_seconds.set(self._seconds, self._name)
+            return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def status(self) -> dict:
+        if self._instance is not _UNSET:
+            state = READY
+        else:
+            state = FAILED if self._error else PENDING
+        return {"state": state, "seconds": self._seconds, "error": self._error}
+
+
+def component(name: str, factory: Callable[[], object], shared: bool = False) -> Component:
+    """Declare a lazily built singleton; shared ones must be read-only and fork-safe"""
+    _components[name] = Component(name, factory, shared)
+    return _components[name]
+
+
+def build_shared():
+    """Build the shared components now, e.g. in the gunicorn master before forking"""
+    for comp in list(_components.values()):
+        if comp._shared:
+            comp.get()
+
+
+async def start() -> Dict[str, float]:
+    """Build every component concurrently in threads; returns seconds taken per component"""
+    started = time.perf_counter()
+    comps = list(_components.values())
+    results = await asyncio.gather(*(asyncio.to_thread(comp.get) for comp in comps), return_exceptions=True)
+    timings = {comp._name: comp._seconds for comp in comps}
+    failed = [comp._name for comp, result in zip(comps, results) if isinstance(result, Exception)]
+    summary = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items() if seconds is not None)
+    logger.info(f"Components ready in {time.perf_counter() - started:.3f}s ({summary})")
+    if failed:
+        logger.error(f"Components failed to initialize: {', '.join(failed)}")
+    return timings
+
+
+def readiness() -> dict:
+    statuses = {name: comp.status() for name, comp in _components.items()}
+    return {"ready": all(s["state"] == READY for s in statuses.values()), "components": statuses}
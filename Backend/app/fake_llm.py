@@ -0,0 +1,44 @@
+"""
+Offline stand-in for the Gemini model.
+
+Used instead of google.generativeai when FAKE_LLM is set (see app.agent), so
+load tests exercise the whole ask path without network access or API quota.
+generate_content blocks for FAKE_LLM_LATENCY_MS, plus up to
+FAKE_LLM_JITTER_MS, like the SDK call it replaces, and fails with
+probability FAKE_LLM_ERROR_RATE.
+"""
+import os
+import random
+import time
+
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY_MS", "800")) / 1000
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER_MS", "400")) / 1000
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+ANSWER = (
+    "In the name of Allah, the Most Gracious, the Most Merciful.\n\n"
+    "This is a placeholder answer from the offline test model. Your question was:\n\n"
+    "{question}\n\n"
+    "Please consult a qualified scholar for guidance on your situation."
+)
+
+
+class FakeLLMError(Exception):
+    pass
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, model_name: str = "fake"):
+        self.model_name = model_name
+
+    def generate_content(self, prompt: str) -> FakeResponse:
+        time.sleep(FAKE_LLM_LATENCY + random.random() * FAKE_LLM_JITTER)
+        if random.random() < FAKE_LLM_ERROR_RATE:
+            raise FakeLLMError("simulated model failure")
+        question = prompt.rsplit("Current question:", 1)[-1].strip().split("\n", 1)[0]
+        return FakeResponse(ANSWER.format(question=question))
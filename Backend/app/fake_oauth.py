@@ -0,0 +1,54 @@
+"""
+Local stand-in for Google's OAuth and userinfo endpoints.
+
+Mounted only when FAKE_OAUTH is set (see app.auth), which also points the
+login flow at these routes. The authorization code is the user's email, so a
+load test can drive /api/auth/google/callback?code=<email> directly without
+any network access. FAKE_OAUTH_LATENCY_MS adds a delay to each call to mimic
+the round-trip to Google.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+
+from fastapi import APIRouter, Form, Header, HTTPException
+from fastapi.responses import RedirectResponse
+
+FAKE_OAUTH_LATENCY = float(os.getenv("FAKE_OAUTH_LATENCY_MS", "0")) / 1000
+
+router = APIRouter(prefix="/fake-oauth")
+
+
+async def _simulate_latency():
+    if FAKE_OAUTH_LATENCY > 0:
+        await asyncio.sleep(FAKE_OAUTH_LATENCY)
+
+
+@router.get("/authorize")
+async def authorize(redirect_uri: str, login_hint: str = None):
+    """Approve immediately, issuing the email as the authorization code"""
+    email = login_hint or f"fake-{uuid.uuid4().hex[:8]}@example.com"
+    return RedirectResponse(f"{redirect_uri}?code={email}")
+
+
+@router.post("/token")
+async def token(code: str = Form(...)):
+    await _simulate_latency()
+    if "@" not in code:
+        raise HTTPException(status_code=400, detail="invalid_grant")
+    return {"access_token": f"fake.{code}", "token_type": "Bearer", "expires_in": 3600}
+
+
+@router.get("/userinfo")
+async def userinfo(authorization: str = Header(None)):
+    await _simulate_latency()
+    if not authorization or not authorization.startswith("Bearer fake."):
+        raise HTTPException(status_code=401, detail="invalid_token")
+    email = authorization[len("Bearer fake."):]
+    return {
+        "id": hashlib.sha256(email.encode()).hexdigest()[:21],
+        "email": email,
+        "name": email.split("@")[0],
+        "picture": ""
+    }
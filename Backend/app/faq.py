@@ -0,0 +1,69 @@
+"""
+Precomputed answers to frequently asked questions.
+
+scripts/mine_faq.py groups past questions from session history by their
+normalized form and writes the popular ones, each with its most common
+answer, to FAQ_STORE_PATH. The store is loaded once per process (before
+forking under gunicorn --preload), /api/ask answers matching questions from
+it without a model call, and the agent seeds its answer cache from it.
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from app.components import component
+from app.metrics import registry
+from app.normalize import words
+
+logger = logging.getLogger(__name__)
+
+FAQ_STORE_PATH = os.getenv("FAQ_STORE_PATH", "faq.json")
+
+cache_hits_total = registry.counter(
+    "cache_hits_total", "Cache lookups that found an entry", ("cache",))
+cache_misses_total = registry.counter(
+    "cache_misses_total", "Cache lookups that missed", ("cache",))
+
+
+def question_key(question: str) -> str:
+    """Normalized form of a question, shared by the FAQ store and the answer cache"""
+    return " ".join(words(question))
+
+
+class FaqStore:
+    def __init__(self, path: str = FAQ_STORE_PATH):
+        self.path = path
+        # Most asked first: {"question", "answer", "count"}
+        self.entries: List[Dict] = []
+        self._answers: Dict[str, str] = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)["entries"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading FAQ store {self.path}: {e}")
+            return
+        self.entries = sorted(entries, key=lambda entry: -entry.get("count", 0))
+        # Keys are recomputed here so the store survives changes to question_key
+        for entry in reversed(self.entries):
+            for question in [entry["question"]] + entry.get("variants", []):
+                self._answers[question_key(question)] = entry["answer"]
+        logger.info(f"Loaded {len(self.entries)} FAQ entries from {self.path}")
+
+    def lookup(self, question: str) -> Optional[str]:
+        if not self._answers:
+            return None
+        answer = self._answers.get(question_key(question))
+        if answer is None:
+            cache_misses_total.inc(1, "faq")
+        else:
+            cache_hits_total.inc(1, "faq")
+        return answer
+
+
+faq_store = component("faq_store", FaqStore, shared=True)
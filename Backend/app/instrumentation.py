@@ -0,0 +1,83 @@
+"""
+Request and event-loop metrics.
+
+RequestMetricsMiddleware times every HTTP request and labels it with the
+matched route template rather than the raw path, so session ids and file
+names don't create a series each. The event-loop monitor measures how late
+a periodic wake-up fires, which is how long handlers or blocking calls held
+the loop.
+"""
+import asyncio
+import time
+
+from app.metrics import registry
+
+# How often the event-loop monitor wakes up, in seconds
+LOOP_LAG_INTERVAL = 0.5
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time to send the full HTTP response", ("method", "route", "status"))
+requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "HTTP requests being handled")
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "Delay of the event loop's periodic wake-up", (), LOOP_LAG_BUCKETS)
+loop_lag_last = registry.gauge(
+    "event_loop_lag_last_seconds", "Event loop lag measured at the last wake-up")
+
+
+def route_template(scope) -> str:
+    """Request path with path parameters put back as {name}, or "unmatched" without a route"""
+    if scope.get("route") is None:
+        return "unmatched"
+    path_params = scope.get("path_params")
+    if not path_params:
+        return scope["path"]
+    names = {str(value): "{" + name + "}" for name, value in path_params.items()}
+    return "/".join(names.get(segment, segment) for segment in scope["path"].split("/"))
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording http_request_duration_seconds"""
+
+    def __init__(self, app):
+        self.app = app
+        # (method, route, status) -> bound histogram series
+        self._series = {}
+        self._in_progress = 0
+        requests_in_progress.set_function(lambda: self._in_progress)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self._in_progress += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self._in_progress -= 1
+            key = (scope["method"], route_template(scope), status)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = request_seconds.labels(key[0], key[1], str(status))
+            series.observe(time.perf_counter() - started)
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """Record event-loop lag until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        loop_lag_seconds.observe(lag)
+        loop_lag_last.set(lag)
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -9,16 +11,59 @@ load_dotenv(dotenv_path=env_path, override=True)
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.api import router
+from app.profile import router as profile_router, forget_deleted_account
+from app.admin import router as admin_router
+from app.avatars import shutdown_pool
+from app.account_deletion import deletion_queue
+from app.post_response import post_tasks
+from app.auth import FAKE_OAUTH
+from app.http_client import close_client
+from app.instrumentation import RequestMetricsMiddleware, monitor_event_loop_lag
+from app.profiling import TraceMiddleware
+from app.metrics import start_snapshots, write_snapshot, render_all, METRICS_DIR
+from app import components, persistence
+from app.components import readiness
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build components in the background while serving, and shut everything down in order."""
+    loop_lag = asyncio.create_task(monitor_event_loop_lag())
+    snapshots = start_snapshots()
+    init = asyncio.create_task(components.start())
+    # Background workers belong to this process; under --preload the master never starts them
+    post_tasks.start()
+    # Accounts deleted through other workers still have sessions in this one's memory
+    deletion_queue.watch(forget_deleted_account)
+    yield
+    init.cancel()
+    loop_lag.cancel()
+    # Answered exchanges are saved after the response; finish them before anything closes
+    post_tasks.drain()
+    # Queued account deletions still need the write-behind queues
+    deletion_queue.drain()
+    # Drain write-behind queues so no accepted mutation is lost
+    persistence.close_all()
+    await close_client()
+    shutdown_pool()
+    if snapshots is not None:
+        snapshots.set()
+        try:
+            # Leave a final snapshot for the surviving workers
+            write_snapshot(METRICS_DIR)
+        except OSError as e:
+            logger.error(f"Failed to write final metrics snapshot: {e}")
+
 app = FastAPI(
     title="Islamic AI Chat Agent",
     description="Backend for Islamic Q&A with local knowledge and Gemini fallback",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -37,9 +82,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TraceMiddleware)
+# Outermost, so the recorded latency includes every other middleware
+app.add_middleware(RequestMetricsMiddleware)
 
 # Include router with /api prefix
 app.include_router(router, prefix="/api")
+app.include_router(profile_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
+
+if FAKE_OAUTH:
+    from app.fake_oauth import router as fake_oauth_router
+    app.include_router(fake_oauth_router, prefix="/api")
+    logger.warning("FAKE_OAUTH is enabled: logins use the local OAuth stand-in")
+
+# Read-only data is built at import so a preloading gunicorn master shares it with workers
+components.build_shared()
 
 @app.get("/")
 def root():
@@ -57,6 +115,17 @@ def health():
         "frontend_url": os.getenv("FRONTEND_URL", "NOT SET"),
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus-format metrics, merged across workers when METRICS_DIR is set."""
+    return render_all()
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once every component is built, with per-component state and startup time."""
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting Islamic AI Backend Server...")
@@ -0,0 +1,297 @@
+"""
+Minimal in-process metrics registry rendered in the Prometheus text format.
+
+Under gunicorn each worker has its own registry. When METRICS_DIR is set,
+every worker periodically writes a snapshot of its registry there and
+/metrics merges all snapshots: counters and histograms are summed over
+every worker that has run since the directory was cleared (so they never go
+backwards when a worker is replaced), gauges are reported per live worker
+with a pid label.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default histogram buckets in seconds, from a few milliseconds up to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Histogram buckets for sizes in characters or bytes
+SIZE_BUCKETS = (256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+# Shared directory for per-worker snapshots; unset for a single process
+METRICS_DIR = os.getenv("METRICS_DIR")
+# Seconds between snapshots of this worker's metrics
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5"))
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...]) -> str:
+    if not label_names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(label_names, label_values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        for label_values, value in list(self._values.items()):
+            yield self.name, self.label_names, label_values, value
+
+    def state(self):
+        """Current values as JSON-friendly (label values, value) pairs"""
+        return [(list(label_values), value) for label_values, value in list(self._values.items())]
+
+    def merge(self, label_values: Tuple[str, ...], value):
+        self._values[label_values] = self._values.get(label_values, 0) + value
+
+
+class Gauge(Counter):
+    """Point-in-time value; either set explicitly or computed by a callback at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self._callbacks: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *label_values: str):
+        with self._lock:
+            self._values[label_values] = value
+
+    def set_function(self, fn: Callable[[], float], *label_values: str):
+        self._callbacks[label_values] = fn
+
+    def samples(self):
+        yield from super().samples()
+        for label_values, fn in list(self._callbacks.items()):
+            try:
+                yield self.name, self.label_names, label_values, fn()
+            except Exception:
+                continue
+
+    def state(self):
+        return [(list(label_values), value) for _, _, label_values, value in self.samples()]
+
+    def merge(self, label_values: Tuple[str, ...], value):
+        self._values[label_values] = value
+
+
+class _BoundHistogram:
+    """Histogram series with fixed label values, for hot paths that observe often"""
+
+    __slots__ = ("_buckets", "_state", "_lock")
+
+    def __init__(self, buckets, state, lock):
+        self._buckets = buckets
+        self._state = state
+        self._lock = lock
+
+    def observe(self, value: float):
+        state = self._state
+        with self._lock:
+            state[0][bisect.bisect_left(self._buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, optionally split by labels"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, label_values: Tuple[str, ...]) -> list:
+        state = self._values.get(label_values)
+        if state is None:
+            with self._lock:
+                state = self._values.setdefault(label_values, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        return state
+
+    def observe(self, value: float, *label_values: str):
+        state = self._state(label_values)
+        with self._lock:
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def labels(self, *label_values: str) -> _BoundHistogram:
+        """Series for label_values whose observe() skips the label lookup"""
+        return _BoundHistogram(self.buckets, self._state(label_values), self._lock)
+
+    def count(self, *label_values: str) -> int:
+        state = self._values.get(label_values)
+        return state[2] if state else 0
+
+    def samples(self):
+        bucket_labels = self.label_names + ("le",)
+        for label_values, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", bucket_labels, label_values + (le,), cumulative
+            yield f"{self.name}_sum", self.label_names, label_values, total
+            yield f"{self.name}_count", self.label_names, label_values, count
+
+    def state(self):
+        with self._lock:
+            return [(list(label_values), [list(counts), total, count])
+                    for label_values, (counts, total, count) in self._values.items()]
+
+    def merge(self, label_values: Tuple[str, ...], value):
+        counts, total, count = value
+        state = self._state(label_values)
+        state[0] = [a + b for a, b in zip(state[0], counts)]
+        state[1] += total
+        state[2] += count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-registering a name returns the existing metric so modules can be re-imported safely
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, label_names, label_values, value in metric.samples():
+                lines.append(f"{name}{_format_labels(label_names, label_values)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {
+            metric.name: {
+                "type": metric.type_name,
+                "description": metric.description,
+                "labels": list(metric.label_names),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "values": metric.state(),
+            }
+            for metric in list(self._metrics.values())
+        }
+
+
+registry = Registry()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot(directory: str = METRICS_DIR):
+    """Write this worker's metrics where other workers can merge them"""
+    path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp, path)
+
+
+def merge_snapshots(snapshots: Dict[int, dict]) -> Registry:
+    """Combine per-worker snapshots, keyed by pid, into one registry for rendering"""
+    merged = Registry()
+    kinds = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+    for pid, snapshot in sorted(snapshots.items()):
+        alive = _pid_alive(pid)
+        for name, data in snapshot.items():
+            kind = kinds.get(data["type"])
+            if kind is None or (kind is Gauge and not alive):
+                continue
+            labels = tuple(data["labels"]) + (("pid",) if kind is Gauge else ())
+            if name not in merged._metrics:
+                args = (data["buckets"],) if kind is Histogram else ()
+                merged.register(kind(name, data["description"], labels, *args))
+            metric = merged._metrics[name]
+            for label_values, value in data["values"]:
+                label_values = tuple(label_values) + ((str(pid),) if kind is Gauge else ())
+                metric.merge(label_values, value)
+    return merged
+
+
+def render_all(directory: str = METRICS_DIR) -> str:
+    """Metrics for every worker sharing directory, or just this process without one"""
+    if not directory:
+        return registry.render()
+    snapshots = {os.getpid(): registry.snapshot()}
+    for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+        try:
+            pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+            if pid not in snapshots:
+                with open(path) as f:
+                    snapshots[pid] = json.load(f)
+        except (ValueError, OSError) as e:
+            logger.warning(f"Skipping metrics snapshot {path}: {e}")
+    return merge_snapshots(snapshots).render()
+
+
+def start_snapshots(directory: str = METRICS_DIR, interval: float = METRICS_SNAPSHOT_INTERVAL):
+    """Snapshot this worker's metrics every interval seconds on a daemon thread"""
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                write_snapshot(directory)
+            except OSError as e:
+                logger.error(f"Failed to write metrics snapshot: {e}")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
+    return stop
@@ -0,0 +1,159 @@
+"""
+Text normalization shared by retrieval, search, caches and classifiers.
+
+normalize() folds the spellings a question can arrive in onto one form, so
+"Salat", "namaz", "ṣalāh" and "الصَّلاة" all match the same keywords, index
+terms and cache keys. It applies, in order:
+
+- Unicode NFKC (Arabic presentation forms, full-width letters, ligatures)
+- lower case
+- one str.translate table: drops Arabic diacritics, tatweel and the
+  apostrophes used for ain and hamza, unifies alef, ya and ta marbuta
+  forms, and strips Latin transliteration accents (ā -> a, ṣ -> s)
+- one dict lookup per word replacing transliteration variants, in Latin
+  or Arabic script, with a canonical word (TRANSLITERATIONS)
+
+Pure-ASCII text skips NFKC and the table. Callers normalize stored text once, when they
+index it, so a query pays for normalizing the query only.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+# Canonical word -> spellings that mean the same thing. Variants are
+# normalized with the character table before use, so accents and Arabic
+# letter forms need not be listed separately.
+TRANSLITERATIONS: Dict[str, List[str]] = {
+    "salah": ["salat", "salaat", "salaah", "solat", "namaz", "namaaz", "صلاة", "صلوات"],
+    "wudu": ["wudhu", "wudoo", "wuzu", "wuzoo", "vuzu", "wazu", "وضوء"],
+    "ghusl": ["ghusal", "غسل"],
+    "tayammum": ["tayamum", "تيمم"],
+    "taharah": ["taharat", "tahara", "طهارة"],
+    "sawm": ["saum", "siyam", "siyaam", "roza", "rozah", "roze", "صوم", "صيام"],
+    "ramadan": ["ramadhan", "ramzan", "ramazan", "رمضان"],
+    "suhoor": ["suhur", "sahur", "sehri", "sehari", "سحور"],
+    "iftar": ["iftaar", "افطار"],
+    "tarawih": ["taraweeh", "taraveeh", "tarawee", "تراويح"],
+    "zakat": ["zakah", "zakaat", "zakaah", "zakath", "زكاة"],
+    "sadaqah": ["sadaqa", "sadqa", "sadaka", "sadqah", "صدقة"],
+    "hajj": ["haj", "hadj", "حج"],
+    "umrah": ["umra", "omra", "عمرة"],
+    "quran": ["koran", "quraan", "qoran", "قران"],
+    "hadith": ["hadees", "hadis", "ahadith", "حديث", "احاديث"],
+    "sunnah": ["sunna"],
+    "dua": ["duaa", "doa", "دعاء"],
+    "tawheed": ["tawhid", "tauheed", "توحيد"],
+    "shahada": ["shahadah", "shahadat", "شهادة"],
+    "madhhab": ["madhab", "mazhab", "مذهب"],
+    "fiqh": ["fikh", "فقه"],
+    "seerah": ["sirah", "sira", "سيرة"],
+    "halal": ["حلال"],
+    "haram": ["حرام"],
+    "iman": ["eeman", "ايمان"],
+    "islam": ["اسلام"],
+    "fajr": ["فجر"],
+    "dhuhr": ["zuhr", "zohar", "duhr", "ظهر"],
+    "asr": ["عصر"],
+    "maghrib": ["magrib", "مغرب"],
+    "isha": ["esha", "ishaa", "عشاء"],
+}
+
+_DROP = (
+    # Arabic harakat, tanween, shadda, sukun, superscript alef and Quranic marks
+    [chr(c) for c in range(0x064B, 0x0660)] + ["ٰ"]
+    + [chr(c) for c in range(0x06D6, 0x06EE)]
+    # Tatweel, and the apostrophes and half rings written for ain and hamza
+    + ["ـ", "'", "’", "‘", "`", "ʿ", "ʾ", "ʻ", "ʼ"]
+)
+_FOLD = {
+    # Alef with hamza or madda, and alef wasla
+    "آ": "ا", "أ": "ا", "إ": "ا", "ٱ": "ا",
+    # Alef maksura and Farsi yeh to ya; ta marbuta to ha
+    "ى": "ي", "ی": "ي", "ة": "ه",
+    # Latin transliteration accents
+    "ā": "a", "á": "a", "â": "a", "à": "a", "ī": "i", "í": "i", "î": "i", "ū": "u", "ú": "u", "û": "u",
+    "ṣ": "s", "ş": "s", "ś": "s", "ḥ": "h", "ḍ": "d", "ṭ": "t", "ẓ": "z", "ż": "z",
+    "ḏ": "dh", "ṯ": "th", "ġ": "gh", "ḫ": "kh", "š": "sh",
+}
+_TABLE = str.maketrans({**{c: None for c in _DROP}, **_FOLD})
+
+
+def _fold(text: str) -> str:
+    if text.isascii():
+        # The only ASCII characters the table changes
+        return text.lower().replace("'", "").replace("`", "")
+    return unicodedata.normalize("NFKC", text).lower().translate(_TABLE)
+
+
+def _is_arabic(word: str) -> bool:
+    return any("؀" <= c <= "ۿ" for c in word)
+
+
+def _canonical_words() -> Dict[str, str]:
+    """Folded variant -> canonical word"""
+    table = {}
+    for canonical, variants in TRANSLITERATIONS.items():
+        for variant in map(_fold, variants):
+            table[variant] = canonical
+            if _is_arabic(variant):
+                # With the article (al-) attached
+                table["ال" + variant] = canonical
+    return table
+
+
+_CANONICAL = _canonical_words()
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _canonical(match: re.Match, lookup=_CANONICAL.get) -> str:
+    word = match.group()
+    return lookup(word, word)
+
+
+def normalize(text: str) -> str:
+    """Lower-cased text with spelling variants folded onto one form"""
+    return _WORD_RE.sub(_canonical, _fold(text))
+
+
+def words(text: str) -> List[str]:
+    """The words of normalize(text)"""
+    lookup = _CANONICAL.get
+    return [lookup(word, word) for word in _WORD_RE.findall(_fold(text))]
+
+
+def word_spans(text: str, only: Optional[Set[str]] = None) -> List[Tuple[str, int, int]]:
+    """
+    The words of normalize(text), or just those in only, each with the [start, end)
+    offsets in text it came from, for highlighting. Folding runs per character (with
+    its combining marks) so every folded character can be traced back to its source.
+    """
+    if text.isascii():
+        if "'" not in text and "`" not in text:
+            folded, starts, ends = text.lower(), range(len(text)), range(1, len(text) + 1)
+        else:
+            # Apostrophes are the only ASCII characters folding removes
+            starts = [i for i, c in enumerate(text) if c != "'" and c != "`"]
+            ends = [i + 1 for i in starts]
+            folded = _fold(text)
+    else:
+        pieces, starts, ends = [], [], []
+        i, n = 0, len(text)
+        while i < n:
+            j = i + 1
+            while j < n and unicodedata.combining(text[j]):
+                j += 1
+            piece = _fold(text[i:j])
+            pieces.append(piece)
+            starts.extend([i] * len(piece))
+            ends.extend([j] * len(piece))
+            i = j
+        folded = "".join(pieces)
+    lookup = _CANONICAL.get
+    spans = []
+    for m in _WORD_RE.finditer(folded):
+        word = m.group()
+        word = lookup(word, word)
+        if only is None or word in only:
+            spans.append((word, starts[m.start()], ends[m.end() - 1]))
+    return spans
@@ -0,0 +1,231 @@
+"""
+Write-behind persistence for the JSON-backed stores.
+
+Stores apply mutations in memory and enqueue a key describing what changed.
+A background thread coalesces everything enqueued during one flush interval
+and hands the batch to the store's flush function, so request handlers never
+wait on disk I/O.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background flushes
+FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.5"))
+# When set, stores write every change before the call that made it returns (useful for tests and scripts)
+SYNC_DURABILITY = os.getenv("PERSIST_SYNC", "").lower() in ("1", "true", "yes")
+
+queue_depth = registry.gauge(
+    "persistence_queue_depth", "Mutations waiting to be written", ("store",))
+durability_lag = registry.gauge(
+    "persistence_durability_lag_seconds", "Age of the oldest unwritten mutation", ("store",))
+last_flush_lag = registry.gauge(
+    "persistence_last_flush_lag_seconds", "Delay between first mutation and write for the last flush", ("store",))
+flush_seconds = registry.gauge(
+    "persistence_last_flush_duration_seconds", "Wall time spent in the last flush", ("store",))
+flush_duration = registry.histogram(
+    "persistence_flush_duration_seconds", "Wall time spent in each flush", ("store",))
+flushes_total = registry.counter(
+    "persistence_flushes_total", "Completed flushes", ("store",))
+flush_errors_total = registry.counter(
+    "persistence_flush_errors_total", "Flushes that raised", ("store",))
+mutations_total = registry.counter(
+    "persistence_mutations_total", "Mutations enqueued", ("store",))
+
+_writers: List["WriteBehindWriter"] = []
+
+
+def atomic_write_text(path: str, text: str):
+    """Write text to a temporary file and rename it over path"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs):
+    atomic_write_text(path, json.dumps(data, **dump_kwargs))
+
+
+class WriteBehindWriter:
+    """
+    Coalesces mutations per key and flushes them from a background thread.
+
+    flush_fn receives a dict mapping each dirty key to the list of payloads
+    enqueued for it since the last flush, in order. It may remove keys (or
+    leading payloads) from the dict as they are written; if it raises, only
+    what is left is requeued.
+
+    enqueue never writes, so stores may call it while holding their own
+    locks; in sync mode they call commit() once those locks are released.
+    """
+
+    def __init__(self, name: str, flush_fn: Callable[[Dict[Hashable, list]], None],
+                 interval: float = None, sync: bool = None):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.interval = FLUSH_INTERVAL if interval is None else interval
+        self.sync = SYNC_DURABILITY if sync is None else sync
+        self._pending: Dict[Hashable, list] = {}
+        self._pending_count = 0
+        self._oldest_pending = None
+        # Called once everything enqueued before them has been written
+        self._callbacks: List[Callable[[], None]] = []
+        # Keys of the batch being written right now
+        self._flushing: frozenset = frozenset()
+        self._cond = threading.Condition()
+        # Serialises flushes so a drain never races the background thread
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+        queue_depth.set_function(lambda: self._pending_count, name)
+        durability_lag.set_function(self._current_lag, name)
+        _writers.append(self)
+
+        if not self.sync:
+            self._thread = threading.Thread(target=self._run, name=f"write-behind-{name}", daemon=True)
+            self._thread.start()
+
+    def _current_lag(self):
+        oldest = self._oldest_pending
+        return time.monotonic() - oldest if oldest is not None else 0.0
+
+    def enqueue(self, key: Hashable, payload: Any = None):
+        """Record a mutation; it will be written within one flush interval, or at commit() in sync mode"""
+        with self._cond:
+            self._pending.setdefault(key, []).append(payload)
+            self._pending_count += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+                self._cond.notify()
+        mutations_total.inc(1, self.name)
+
+    def commit(self):
+        """Write pending mutations now in sync mode or after close; otherwise the thread will"""
+        if self.sync or self._closed:
+            self.flush()
+
+    def on_durable(self, fn: Callable[[], None]):
+        """Call fn, on the flushing thread, once every mutation enqueued so far is written"""
+        with self._cond:
+            if self._pending:
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def has_pending(self, key: Hashable) -> bool:
+        with self._cond:
+            return key in self._pending
+
+    def discard(self, key: Hashable):
+        """Drop pending payloads for key (e.g. the record was deleted)"""
+        with self._cond:
+            payloads = self._pending.pop(key, None)
+            if payloads:
+                self._pending_count -= len(payloads)
+            if not self._pending:
+                self._oldest_pending = None
+
+    def _take_batch(self):
+        with self._cond:
+            batch, oldest, callbacks = self._pending, self._oldest_pending, self._callbacks
+            self._pending, self._pending_count, self._oldest_pending, self._callbacks = {}, 0, None, []
+            self._flushing = frozenset(batch)
+            return batch, oldest, callbacks
+
+    def flush(self):
+        """Write everything pending right now, on the calling thread"""
+        with self._flush_lock:
+            self._flush_locked()
+
+    def flush_key(self, key: Hashable):
+        """Return once every mutation enqueued for key, including one mid-flush, is written"""
+        with self._cond:
+            # A flush in progress has already taken its batch out of _pending
+            if key not in self._pending and key not in self._flushing:
+                return
+        with self._flush_lock:
+            if self.has_pending(key):
+                self._flush_locked()
+
+    def _flush_locked(self):
+        batch, oldest, callbacks = self._take_batch()
+        if not batch:
+            for fn in callbacks:
+                fn()
+            return
+        started = time.monotonic()
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            flush_errors_total.inc(1, self.name)
+            logger.error(f"Error flushing {self.name}: {e}")
+            self._requeue(batch, oldest, callbacks)
+            return
+        finally:
+            with self._cond:
+                self._flushing = frozenset()
+        finished = time.monotonic()
+        flushes_total.inc(1, self.name)
+        flush_seconds.set(finished - started, self.name)
+        flush_duration.observe(finished - started, self.name)
+        last_flush_lag.set(finished - oldest, self.name)
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Error in {self.name} durability callback: {e}")
+
+    def _requeue(self, batch, oldest, callbacks):
+        """Put a failed batch back in front of anything enqueued meanwhile"""
+        with self._cond:
+            for key, payloads in self._pending.items():
+                batch.setdefault(key, []).extend(payloads)
+            self._pending = batch
+            self._callbacks = callbacks + self._callbacks
+            self._pending_count = sum(len(p) for p in batch.values())
+            self._oldest_pending = oldest
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # Let a burst of mutations accumulate into one write; close() cuts the wait short
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed, timeout=self.interval)
+            self.flush()
+
+    def close(self):
+        """Stop the background thread and drain the queue"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+def flush_all():
+    for writer in list(_writers):
+        writer.flush()
+
+
+def close_all():
+    """Drain every writer; called on application shutdown"""
+    for writer in list(_writers):
+        writer.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,141 @@
+"""
+Work done after a response has been sent.
+
+The ask handler returns the answer as soon as it exists and submits the rest
+(saving the exchange, search indexing, stats, answer caching) here. Tasks run
+in submission order on one worker thread, so two exchanges in the same
+session are stored in the order they were answered. The queue holds at most
+POST_RESPONSE_QUEUE_SIZE tasks; when it is full, submit runs the task on a
+thread of its own and waits for it, so a backlog slows requests down rather
+than growing without bound. The worker thread is started by the app's
+lifespan (or the first submit), never at import, so under gunicorn --preload
+each worker runs its own rather than the master. A task that raises is retried with backoff up to
+POST_RESPONSE_RETRIES times, so tasks must be safe to run again.
+
+Tasks are tagged with keys (a session id, a user id) so reads that must see
+them, like a session list right after an ask, can wait for that key only.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Callable, Hashable, Iterable
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Tasks waiting to run; beyond this submit runs them inline
+POST_RESPONSE_QUEUE_SIZE = int(os.getenv("POST_RESPONSE_QUEUE_SIZE", "1000"))
+# Further attempts for a failing task, with the delay doubling from POST_RESPONSE_RETRY_DELAY
+POST_RESPONSE_RETRIES = int(os.getenv("POST_RESPONSE_RETRIES", "3"))
+POST_RESPONSE_RETRY_DELAY = float(os.getenv("POST_RESPONSE_RETRY_DELAY", "0.1"))
+# Longest a read waits for the caller's own post-response work before answering anyway
+SETTLE_TIMEOUT = float(os.getenv("POST_RESPONSE_SETTLE_TIMEOUT", "2"))
+
+queue_depth = registry.gauge(
+    "post_response_queue_depth", "Post-response tasks waiting to run")
+task_lag = registry.histogram(
+    "post_response_lag_seconds", "Delay between submitting a post-response task and starting it", ("task",))
+inline_total = registry.counter(
+    "post_response_inline_total", "Post-response tasks run outside the queue because it was full", ("task",))
+retries_total = registry.counter(
+    "post_response_retries_total", "Post-response task attempts that raised and were retried", ("task",))
+failures_total = registry.counter(
+    "post_response_failures_total", "Post-response tasks dropped after their last retry", ("task",))
+
+
+class PostResponseQueue:
+    def __init__(self, maxsize: int = POST_RESPONSE_QUEUE_SIZE):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        # key -> tasks submitted for it and not yet finished
+        self._pending: Counter = Counter()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        queue_depth.set_function(self._queue.qsize)
+
+    def start(self):
+        """Start the worker thread in this process, if it isn't running"""
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="post-response", daemon=True)
+                self._thread.start()
+
+    async def submit(self, name: str, fn: Callable, *args, keys: Iterable[Hashable] = ()):
+        """Run fn(*args) after the response; keys are what the task changes"""
+        self.start()
+        keys = tuple(keys)
+        task = (name, fn, args, keys, time.monotonic())
+        with self._cond:
+            self._pending.update(keys)
+            if not self._closed:
+                try:
+                    self._queue.put_nowait(task)
+                    return
+                except queue.Full:
+                    inline_total.inc(1, name)
+        # Retries sleep, so even the inline path stays off the event loop
+        await asyncio.to_thread(self._execute, task)
+
+    def pending(self, key: Hashable) -> bool:
+        return self._pending[key] > 0
+
+    def wait_idle(self, key: Hashable, timeout: float = None) -> bool:
+        """Block until no task for key is queued or running; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending[key] <= 0, timeout)
+
+    async def settled(self, key: Hashable, timeout: float = SETTLE_TIMEOUT):
+        """Let a request read its own writes: wait, off the event loop, for pending tasks on key"""
+        if self.pending(key):
+            await asyncio.to_thread(self.wait_idle, key, timeout)
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            self._execute(task)
+
+    def _execute(self, task):
+        name, fn, args, keys, submitted = task
+        task_lag.observe(time.monotonic() - submitted, name)
+        try:
+            for attempt in range(POST_RESPONSE_RETRIES + 1):
+                try:
+                    fn(*args)
+                    return
+                except Exception as e:
+                    if attempt == POST_RESPONSE_RETRIES:
+                        failures_total.inc(1, name)
+                        logger.error(f"Post-response task {name} failed after {attempt + 1} attempts: {e}",
+                                     exc_info=True)
+                        return
+                    retries_total.inc(1, name)
+                    logger.warning(f"Post-response task {name} failed, retrying: {e}")
+                    time.sleep(POST_RESPONSE_RETRY_DELAY * 2 ** attempt)
+        finally:
+            with self._cond:
+                self._pending.subtract(keys)
+                for key in keys:
+                    if self._pending[key] <= 0:
+                        self._pending.pop(key, None)
+                self._cond.notify_all()
+
+    def drain(self):
+        """Run everything queued, then stop; later submissions run inline"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+post_tasks = PostResponseQueue()
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser, MultiPartException
 from app.auth import get_current_user, user_db
+from app.api import session_manager, admission
+from app.account_deletion import deletion_queue
+from app.post_response import post_tasks
+from app.avatars import (
+    PROFILE_PICS_DIR, MAX_AVATAR_BYTES, AVATAR_MAX_AGE, AVATAR_FALLBACK_MAX_AGE, AVATAR_NAME_RE, MEDIA_TYPES,
+    sniff_extension, avatar_stem, pick_variant, wants_variant, remove_avatars, schedule_variants
+)
 from app.model import ProfileUpdate, UserResponse, UserStats
+from app.responses import is_not_modified
 from datetime import datetime
-import shutil
+import asyncio
+import hashlib
 import os
 from typing import Optional
-import json
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
-PROFILE_PICS_DIR = "profile_pics"
-os.makedirs(PROFILE_PICS_DIR, exist_ok=True)
+# Room for multipart boundaries and part headers on top of the picture itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
 
 @router.get("/me", response_model=UserResponse)
 async def get_profile(current_user: dict = Depends(get_current_user)):
@@ -46,7 +57,7 @@ async def update_profile(
     if profile_update.settings:
         user["settings"] = {**user.get("settings", {}), **profile_update.settings}
     
-    user_db.update_user(email, user)
+    await asyncio.to_thread(user_db.update_user, email, user)
     
     return UserResponse(
         email=user["email"],
@@ -58,80 +69,167 @@ async def update_profile(
         settings=user.get("settings", {})
     )
 
+class _UploadTooLarge(Exception):
+    pass
+
+async def _capped_stream(request: Request, limit: int):
+    """Request body chunks, stopping as soon as more than limit bytes have arrived"""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _UploadTooLarge()
+        yield chunk
+
+def _store_upload(source, path: str) -> str:
+    """Copy an uploaded file into place atomically and return its SHA-256"""
+    digest = hashlib.sha256()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as out:
+        while True:
+            chunk = source.read(64 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    os.replace(tmp_path, path)
+    return digest.hexdigest()
+
 @router.post("/picture")
 async def upload_profile_picture(
-    file: UploadFile = File(...),
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Upload profile picture"""
     email = current_user["email"]
+    limit = MAX_AVATAR_BYTES + MULTIPART_OVERHEAD_BYTES
+    too_large = HTTPException(status_code=413, detail=f"Picture must be at most {MAX_AVATAR_BYTES // (1024 * 1024)} MB")
     
-    # Validate file type
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    # Reject on the declared size before reading anything, then enforce it while streaming
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise too_large
+    try:
+        parser = MultiPartParser(request.headers, _capped_stream(request, limit), max_files=1, max_fields=1)
+        form = await parser.parse()
+    except _UploadTooLarge:
+        raise too_large
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Save file
-    file_extension = file.filename.split(".")[-1]
-    filename = f"{email.replace('@', '_at_')}.{file_extension}"
-    file_path = os.path.join(PROFILE_PICS_DIR, filename)
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    try:
+        if file.size is not None and file.size > MAX_AVATAR_BYTES:
+            raise too_large
+        # Validate file type from its contents
+        extension = sniff_extension(await file.read(16))
+        if extension is None:
+            raise HTTPException(status_code=400, detail="File must be a JPEG, PNG, GIF or WebP image")
+        await file.seek(0)
+        
+        stem = avatar_stem(email)
+        filename = f"{stem}.{extension}"
+        file_path = os.path.join(PROFILE_PICS_DIR, filename)
+        digest = await asyncio.to_thread(_store_upload, file.file, file_path)
+    finally:
+        await form.close()
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await asyncio.to_thread(remove_avatars, stem, keep=file_path)
+    schedule_variants(file_path)
     
-    # Update user profile with picture URL
-    user = user_db.get_user(email)
-    if user:
-        picture_url = f"/profile/picture/{filename}"
-        user["picture"] = picture_url
-        user_db.update_user(email, user)
+    # Update user profile with picture URL; the version changes whenever the content does
+    backend_url = os.getenv("BACKEND_URL", "http://localhost:8000").rstrip("/")
+    picture_url = f"{backend_url}/api/profile/picture/{filename}?v={digest[:12]}"
+    await asyncio.to_thread(user_db.update_user, email, {"picture": picture_url})
     
     return {"picture_url": picture_url}
 
+@router.get("/picture/{filename}")
+async def get_profile_picture(filename: str, request: Request, size: Optional[int] = None):
+    """Serve a profile picture, or its smallest variant at least size pixels wide"""
+    if not AVATAR_NAME_RE.match(filename):
+        raise HTTPException(status_code=404, detail="Picture not found")
+    original = os.path.join(PROFILE_PICS_DIR, filename)
+    path = pick_variant(original, size) if size else original
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Picture not found")
+    
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if size and path == original and wants_variant(size):
+        # The variant is still being generated; don't pin the full-size image to its URL
+        cache_control = f"public, max-age={AVATAR_FALLBACK_MAX_AGE}"
+    else:
+        cache_control = f"public, max-age={AVATAR_MAX_AGE}, immutable"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=MEDIA_TYPES[filename.rsplit(".", 1)[1]], headers=headers)
+
 @router.get("/stats", response_model=UserStats)
 async def get_user_stats(current_user: dict = Depends(get_current_user)):
     """Get user statistics"""
     email = current_user["email"]
-    user = user_db.get_user(email)
-    
-    # Load sessions for this user
-    sessions_file = f"sessions_{email.replace('@', '_at_')}.json"
-    try:
-        with open(sessions_file, 'r') as f:
-            sessions = json.load(f)
-    except:
-        sessions = {}
-    
-    # Calculate stats
-    total_chats = len(sessions)
-    total_messages = sum(s.get("message_count", 0) for s in sessions.values())
-    
-    # Analyze topics (simplified)
-    topics = ["Prayer", "Fasting", "Zakat", "Hajj", "Quran", "Hadith"]
+    await post_tasks.settled(email)
+    # May classify sessions indexed before topics were counted, reading their logs
+    stats = await asyncio.to_thread(session_manager.get_user_stats, email)
     
     return UserStats(
-        total_chats=total_chats,
-        total_messages=total_messages,
-        favorite_topics=topics[:3],
-        joined_date=user.get("created_at", datetime.now().isoformat()),
-        last_active=user.get("last_login", datetime.now().isoformat())
+        total_chats=stats.chats,
+        total_messages=stats.messages,
+        favorite_topics=stats.favorite_topics(),
+        joined_date=current_user.get("created_at", datetime.now().isoformat()),
+        last_active=stats.last_active or current_user.get("last_login", datetime.now().isoformat())
     )
 
-@router.delete("/me")
+@router.delete("/me", status_code=202)
 async def delete_account(current_user: dict = Depends(get_current_user)):
-    """Delete user account"""
+    """Delete user account; sessions and files are removed by a background job"""
     email = current_user["email"]
     
-    # Remove user from database
-    if email in user_db.users:
-        del user_db.users[email]
-        user_db.save_users()
+    # Remove user from database; the account is unusable from here on
+    await asyncio.to_thread(user_db.delete_user, email)
     
-    # Delete user sessions file
-    sessions_file = f"sessions_{email.replace('@', '_at_')}.json"
-    if os.path.exists(sessions_file):
-        os.remove(sessions_file)
+    def delete_sessions(job):
+        def progress(deleted, total):
+            job.sessions_deleted, job.sessions_total = deleted, total
+            deletion_queue.report(job)
+        # Let exchanges answered just before the delete land first, so they are deleted too
+        post_tasks.wait_idle(email, timeout=30)
+        job.sessions_total = session_manager.delete_user_sessions(email, progress=progress)
     
-    return {"message": "Account deleted successfully"}
+    job = await asyncio.to_thread(deletion_queue.submit, email, [
+        delete_sessions,
+        lambda job: remove_avatars(avatar_stem(email)),
+        lambda job: admission.forget(email),
+    ])
+    
+    return {
+        "message": "Account deleted; removing conversations in the background",
+        "job_id": job.id,
+        "status_url": f"/api/profile/deletion/{job.id}"
+    }
+
+def forget_deleted_account(email: str, deleted_at: float):
+    """
+    Drop sessions this worker still holds for an account another worker deleted:
+    ones it loaded before the deletion, or created itself and the other never saw
+    """
+    if session_manager.session_ids(email):
+        created_before = datetime.fromtimestamp(deleted_at).isoformat()
+        session_manager.delete_user_sessions(email, created_before=created_before)
+
+@router.get("/deletion/{job_id}")
+async def get_deletion_status(job_id: str):
+    """Progress of an account deletion job; the unguessable job id is the credential"""
+    job = await asyncio.to_thread(deletion_queue.find, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job.to_dict()
 
 @router.get("/settings")
 async def get_settings(current_user: dict = Depends(get_current_user)):
@@ -163,6 +261,6 @@ async def update_settings(
         raise HTTPException(status_code=404, detail="User not found")
     
     user["settings"] = {**user.get("settings", {}), **settings}
-    user_db.update_user(email, user)
+    await asyncio.to_thread(user_db.update_user, email, user)
     
     return user["settings"]
\ No newline at end of file
@@ -0,0 +1,344 @@
+"""
+Diagnostics for slow or growing workers: sampling profiles, request spans
+and memory snapshot diffs. Exposed to admins through app.admin.
+
+The sampling profiler is a thread that records every other thread's Python
+stack PROFILE_INTERVAL_MS apart for a fixed time, so the overhead is a few
+percent of one core while it runs and nothing otherwise. Finished profiles
+are written to PROFILE_DIR in collapsed-stack format, so a download can be
+answered by any worker, and can be rendered as a flamegraph SVG.
+
+Request spans are opt-in per request: TraceMiddleware starts a trace when a
+request carries an X-Trace header, span() records named timings into it, and
+the spans are returned in a Server-Timing header if the request turns out to
+be an admin's. Without the header span() costs one context variable lookup.
+"""
+import contextvars
+import html
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "islamic-agent-profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = 300
+# Finished profiles kept in PROFILE_DIR; older ones are deleted
+PROFILE_KEEP = 20
+# Frames recorded per allocation while tracemalloc is on
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+TRACE_HEADER = b"x-trace"
+
+
+# Sampling profiler
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, seconds: float, interval: float):
+        self.id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self.seconds = seconds
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.started_at = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def _sample(self, own_ident: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline and not self._stop.wait(self.interval):
+            self._sample(own_ident)
+        try:
+            self._save()
+        except OSError as e:
+            logger.error(f"Failed to save profile {self.id}: {e}")
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _save(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{self.id}.collapsed")
+        with open(f"{path}.tmp", "w") as f:
+            f.write(self.collapsed())
+        os.replace(f"{path}.tmp", path)
+        logger.info(f"Profile {self.id}: {self.samples} samples over {time.time() - self.started_at:.1f}s")
+        for old in list_profiles()[PROFILE_KEEP:]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{old}.collapsed"))
+            except OSError:
+                pass
+
+
+_profiler: Optional[SamplingProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def start_profile(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS) -> Optional[SamplingProfiler]:
+    """Start sampling this worker for seconds; None if a profile is already running"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None and _profiler.running:
+            return None
+        _profiler = SamplingProfiler(min(seconds, PROFILE_MAX_SECONDS), max(interval_ms, 1) / 1000)
+        _profiler.start()
+        return _profiler
+
+
+def stop_profile() -> Optional[SamplingProfiler]:
+    """Stop the running profile early; it is saved as usual"""
+    profiler = _profiler
+    if profiler is None or not profiler.running:
+        return None
+    profiler.stop()
+    profiler._thread.join(timeout=5)
+    return profiler
+
+
+def running_profile() -> Optional[SamplingProfiler]:
+    profiler = _profiler
+    return profiler if profiler is not None and profiler.running else None
+
+
+def list_profiles() -> List[str]:
+    """Ids of finished profiles, newest first"""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except OSError:
+        return []
+    return sorted((n[:-len(".collapsed")] for n in names if n.endswith(".collapsed")), reverse=True)
+
+
+def read_profile(profile_id: str) -> Optional[str]:
+    if profile_id not in list_profiles():
+        return None
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.collapsed")) as f:
+        return f.read()
+
+
+def _parse_collapsed(text: str):
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack and count.isdigit():
+            yield stack.split(";"), int(count)
+
+
+def render_flamegraph(collapsed: str, title: str = "Flame graph", width: int = 1200) -> str:
+    """An SVG flame graph (root at the top) of collapsed stacks"""
+    root = {"children": {}, "value": 0}
+    for frames, count in _parse_collapsed(collapsed):
+        root["value"] += count
+        node = root
+        for name in frames:
+            node = node["children"].setdefault(name, {"children": {}, "value": 0})
+            node["value"] += count
+    row, pad = 16, 24
+    rects = []
+
+    def layout(node, x, depth):
+        scale = (width - 20) / root["value"]
+        for name, child in sorted(node["children"].items()):
+            w = child["value"] * scale
+            if w >= 0.5:
+                hue = zlib.crc32(name.encode()) % 60
+                label = html.escape(name)
+                pct = 100 * child["value"] / root["value"]
+                y = pad + depth * row
+                text = ""
+                if w > 35:
+                    chars = int(w / 7)
+                    shown = label if len(name) <= chars else html.escape(name[:chars - 2]) + ".."
+                    text = f'<text x="{x + 3:.1f}" y="{y + 12}">{shown}</text>'
+                rects.append(
+                    f'<g><title>{label} ({child["value"]} samples, {pct:.2f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+                    f'fill="hsl({hue},85%,60%)"/>{text}</g>'
+                )
+                layout(child, x, depth + 1)
+            x += w
+
+    def depth_of(node):
+        return 1 + max((depth_of(c) for c in node["children"].values()), default=0)
+
+    if root["value"]:
+        layout(root, 10, 0)
+    height = pad + depth_of(root) * row + 10
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">'
+        f'<text x="10" y="16" font-size="13">{html.escape(title)} ({root["value"]} samples)</text>'
+        + "".join(rects) + "</svg>"
+    )
+
+
+# Request spans
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    __slots__ = ("id", "started", "spans", "authorized")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        # (name, offset from start, duration), in seconds
+        self.spans: List[tuple] = []
+        self.authorized = False
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={duration * 1000:.2f}" for name, _, duration in self.spans)
+
+
+class span:
+    """Context manager timing a named step of the current request, if it is being traced"""
+
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _trace.get()
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            finished = time.perf_counter()
+            self.trace.spans.append((self.name, self.started - self.trace.started, finished - self.started))
+        return False
+
+
+def authorize_trace(is_admin: bool):
+    """Called once the request's user is known; only admins get their spans back"""
+    trace = _trace.get()
+    if trace is not None and is_admin:
+        trace.authorized = True
+
+
+class TraceMiddleware:
+    """ASGI middleware starting a trace for requests that send an X-Trace header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(k == TRACE_HEADER for k, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        trace = Trace()
+        token = _trace.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and trace.authorized:
+                total = time.perf_counter() - trace.started
+                timing = trace.server_timing()
+                timing = f"{timing}, total;dur={total * 1000:.2f}" if timing else f"total;dur={total * 1000:.2f}"
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode()),
+                    (b"x-trace-id", trace.id.encode()),
+                ]
+                logger.info(f"Trace {trace.id} {scope['method']} {scope['path']}: {timing}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _trace.reset(token)
+
+
+# Memory snapshots
+
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def start_tracemalloc(frames: int = TRACEMALLOC_FRAMES):
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        _last_snapshot = None
+
+
+def stop_tracemalloc():
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def memory_diff(limit: int = 25, path_filter: str = None, group_by: str = "lineno") -> Dict:
+    """
+    Take a snapshot and compare it with the previous one (the first call only sets
+    the baseline). path_filter keeps allocations with a file in their traceback whose
+    path contains it, e.g. "session_manager" or "retriever".
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    previous, _last_snapshot = _last_snapshot, snapshot
+    if path_filter:
+        only = (tracemalloc.Filter(True, f"*{path_filter}*", all_frames=True),)
+        snapshot = snapshot.filter_traces(only)
+        previous = previous.filter_traces(only) if previous is not None else None
+    current, peak = tracemalloc.get_traced_memory()
+    report = {"traced_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1), "baseline": previous is None}
+    if previous is None:
+        stats = snapshot.statistics(group_by)[:limit]
+        report["top"] = [
+            {"location": _location(s.traceback), "size_kb": round(s.size / 1024, 1), "count": s.count}
+            for s in stats
+        ]
+    else:
+        stats = snapshot.compare_to(previous, group_by)[:limit]
+        report["top"] = [
+            {"location": _location(s.traceback), "size_diff_kb": round(s.size_diff / 1024, 1),
+             "count_diff": s.count_diff, "size_kb": round(s.size / 1024, 1)}
+            for s in stats
+        ]
+    return report
+
+
+def _location(traceback) -> str:
+    return " <- ".join(f"{os.path.basename(f.filename)}:{f.lineno}" for f in list(traceback)[:3])
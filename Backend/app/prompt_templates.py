@@ -2,6 +2,7 @@
 Islamic AI Agent Prompt Templates
 Advanced prompt management optimized for Google Gemini AI
 """
+from app.normalize import normalize
 
 # ===== CORE SYSTEM PROMPTS =====
 SYSTEM_BASE = """You are an Islamic AI Assistant providing authentic Islamic guidance based on Quran, Hadith, and classical Islamic sources.
@@ -227,6 +228,13 @@ RESPONSE_TEMPLATES = {
     "ethical": "{answer}",
     "complex_fiqh": "{answer}",
     "detailed_fiqh": "{answer}",
+    "reference": """As-salamu alaykum.
+
+{answer}
+
+If you would like an explanation of its meaning or context, just ask.
+
+And Allah knows best.""",
     "fallback": """As-salamu alaykum. Regarding your question about "{question}":
 
 I've consulted our Islamic knowledge sources. {general_guidance}
@@ -259,14 +267,14 @@ May Allah grant us access to beneficial knowledge and righteous scholars."""
 # ===== COMPLEX QUESTION DETECTION =====
 def is_complex_fiqh_question(question: str) -> bool:
     """Detect if a question requires complex fiqh analysis"""
-    question_lower = question.lower()
+    question_lower = normalize(question)
     
     # Enhanced complex fiqh indicators
     complex_indicators = [
         'ruling on', 'according to hanafi', 'hanafi school', 'school of thought',
         'fiqh ruling', 'is it permissible', 'is it allowed', 'halal or haram',
         'what is the hukum', 'is it valid', 'detailed ruling', 'jurisprudential',
-        'classical opinion', 'scholarly opinion', 'madhab', 'madhhab',
+        'classical opinion', 'scholarly opinion', 'madhhab',
         'is it makruh', 'is it wajib', 'is it sunnah', 'what is the daleel',
         'evidences for', 'proofs for', 'islamic ruling', 'shariah ruling',
         'what does hanafi', 'hanafi position', 'hanafi view', 'fiqh opinion'
@@ -295,7 +303,7 @@ def is_complex_fiqh_question(question: str) -> bool:
 
 def requires_detailed_fiqh(question: str) -> bool:
     """Check if question requires detailed fiqh analysis"""
-    question_lower = question.lower()
+    question_lower = normalize(question)
     
     detailed_fiqh_indicators = [
         'detailed ruling', 'evidences', 'proofs', 'daleel', 'evidence from quran',
@@ -316,12 +324,12 @@ def should_recommend_scholar(question: str) -> bool:
         'marriage crisis', 'family dispute', 'legal ruling'
     ]
     
-    question_lower = question.lower()
+    question_lower = normalize(question)
     return any(topic in question_lower for topic in sensitive_topics)
 
 def get_scholar_recommendation_topic(question: str) -> str:
     """Get the specific topic for scholar recommendation"""
-    question_lower = question.lower()
+    question_lower = normalize(question)
     
     if any(word in question_lower for word in ['divorce', 'marriage', 'marital']):
         return "marriage and family matters"
@@ -382,7 +390,7 @@ def get_prompt_for_question(question: str, context: str, context_quality: str, c
 
 def _classify_question_type(question: str) -> str:
     """Classify the type of question for specialized handling"""
-    question_lower = question.lower()
+    question_lower = normalize(question)
     
     # Complex fiqh takes priority
     if is_complex_fiqh_question(question):
@@ -421,7 +429,7 @@ def _classify_question_type(question: str) -> str:
 
 def _get_topic_guidance(question: str) -> str:
     """Get topic-specific guidance for the prompt"""
-    question_lower = question.lower()
+    question_lower = normalize(question)
     
     for topic, guidance in TOPIC_SPECIFIC_PROMPTS.items():
         if topic in question_lower:
@@ -429,8 +437,8 @@ def _get_topic_guidance(question: str) -> str:
     
     # Check for keyword matches
     keyword_mappings = {
-        'prayer': ['prayer', 'salah', 'namaz', 'salat'],
-        'fasting': ['fast', 'ramadan', 'sawm', 'roza'],
+        'prayer': ['prayer', 'salah'],
+        'fasting': ['fast', 'ramadan', 'sawm'],
         'zakat': ['zakat', 'charity', 'sadaqah'],
         'hajj': ['hajj', 'pilgrimage', 'umrah'],
         'family': ['marriage', 'divorce', 'family', 'parent', 'child', 'wife', 'husband'],
@@ -469,7 +477,7 @@ def get_response_type_for_question(question: str) -> str:
     elif requires_detailed_fiqh(question):
         return "detailed_fiqh"
     
-    question_lower = question.lower()
+    question_lower = normalize(question)
     
     if any(word in question_lower for word in ['current', 'recent', 'news', 'today']):
         return "current_events"
@@ -0,0 +1,133 @@
+"""
+Token-bucket admission control for /api/ask.
+
+Every question must take one token from the asking user's bucket and one
+from the global bucket before the agent runs. Bucket state lives in a small
+SQLite database so all gunicorn workers share the same limits. A request
+refused by the user's bucket is "throttled"; one refused only by the global
+bucket is "shed" because the service as a whole is over capacity.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "ratelimit.db")
+# Sustained questions per minute and burst size for each user
+ASK_USER_PER_MINUTE = float(os.getenv("ASK_USER_PER_MINUTE", "10"))
+ASK_USER_BURST = float(os.getenv("ASK_USER_BURST", "5"))
+# Sustained questions per minute and burst size across all users (sized to the Gemini quota)
+ASK_GLOBAL_PER_MINUTE = float(os.getenv("ASK_GLOBAL_PER_MINUTE", "300"))
+ASK_GLOBAL_BURST = float(os.getenv("ASK_GLOBAL_BURST", "50"))
+
+ADMITTED = "admitted"
+THROTTLED = "throttled"
+SHED = "shed"
+
+admission_total = registry.counter(
+    "ask_admission_total", "Questions by admission outcome (admitted, throttled, shed)", ("outcome",))
+fallback_answers_total = registry.counter(
+    "ask_fallback_answers_total", "Refused questions answered from the answer cache or local knowledge", ("source",))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+class SqliteTokenBuckets:
+    """Token buckets keyed by name, refilled lazily on each take"""
+
+    def __init__(self, path: str = RATE_LIMIT_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._connect().execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets: List[Tuple[str, float, float]]) -> Tuple[Optional[str], float]:
+        """
+        Take one token from every bucket, given as (key, tokens per second, capacity),
+        or from none of them. Returns (None, 0) on success, otherwise the first bucket
+        that ran dry and the seconds until every dry bucket holds a token again.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            dry_key, retry_after = None, 0.0
+            for key, rate, capacity in buckets:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                if tokens < 1:
+                    dry_key = dry_key or key
+                    retry_after = max(retry_after, (1 - tokens) / rate)
+                levels.append((key, tokens))
+            if dry_key is None:
+                conn.executemany(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    [(key, tokens - 1, now) for key, tokens in levels]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return dry_key, retry_after
+
+    def discard(self, key: str):
+        """Forget a bucket; it starts full the next time it is used"""
+        self._connect().execute("DELETE FROM buckets WHERE key = ?", (key,))
+
+
+class AdmissionControl:
+    """Per-user and global limits for questions that reach the agent"""
+
+    def __init__(self, path: str = RATE_LIMIT_DB_PATH):
+        self.buckets = SqliteTokenBuckets(path)
+
+    def admit(self, user_id: str) -> Tuple[str, float]:
+        """Return (outcome, retry_after_seconds); fails open if the bucket store is unavailable"""
+        limits = []
+        if ASK_USER_PER_MINUTE > 0:
+            limits.append((f"user:{user_id}", ASK_USER_PER_MINUTE / 60, ASK_USER_BURST))
+        if ASK_GLOBAL_PER_MINUTE > 0:
+            limits.append(("global", ASK_GLOBAL_PER_MINUTE / 60, ASK_GLOBAL_BURST))
+        outcome, retry_after = ADMITTED, 0.0
+        if limits:
+            try:
+                dry_key, retry_after = self.buckets.take(limits)
+            except sqlite3.Error as e:
+                logger.error(f"Rate limit store error, admitting: {e}")
+                dry_key = None
+            if dry_key == "global":
+                outcome = SHED
+            elif dry_key is not None:
+                outcome = THROTTLED
+        admission_total.inc(1, outcome)
+        return outcome, retry_after
+
+    def forget(self, user_id: str):
+        """Drop user_id's bucket, e.g. once the account is deleted"""
+        try:
+            self.buckets.discard(f"user:{user_id}")
+        except sqlite3.Error as e:
+            logger.error(f"Rate limit store error, bucket for {user_id} kept: {e}")
@@ -0,0 +1,138 @@
+"""
+Direct answers for explicit Quran and hadith references.
+
+Questions like "what does Quran 2:255 say" or "show Bukhari 1" are lookups,
+not questions for the model. ReferenceTable indexes every verse and hadith
+in app/data by its reference when the app starts, and find_references
+extracts references from a question with precompiled patterns. When every
+reference in a question is in the table and the user is not asking for an
+explanation, the agent answers from the table without a model call.
+"""
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.components import component
+from app.retriever import DATA_DIR
+
+QURAN_FILE = "quran.txt"
+HADITH_FILES = {"bukhari": "hadith_bukhari.txt"}
+HADITH_NAMES = {"bukhari": "Sahih al-Bukhari"}
+# References answered from the table in one reply
+MAX_REFERENCES = 10
+
+# "Surah Al-Baqarah (The Cow) - Quran 2:255 - Ayat al-Kursi"
+_SURAH_HEADING = re.compile(
+    r"^Surah (?P<name>[^(]+?) \((?P<meaning>[^)]+)\) - Quran (?P<surah>\d+):(?P<start>\d+)(?:-(?P<end>\d+))?"
+    r"(?: - (?P<title>.+))?$"
+)
+# "Sahih al-Bukhari - Book 1: Revelation"
+_BOOK_HEADING = re.compile(r"^Sahih al-Bukhari - (?P<book>Book \d+: .+)$")
+# A hadith ends with its number: '... (Bukhari 1)'
+_HADITH_NUMBER = re.compile(r"\((?P<collection>Bukhari) (?P<number>\d+)\)\s*$")
+
+_VERSE_RANGE = r"(?P<start>\d{1,3})(?:\s*-\s*(?P<end>\d{1,3}))?"
+# "Quran 2:255", "Qur'an 2 : 255-256", "surah 112 verse 1", "sura 2, ayah 183"
+_QURAN_REFERENCE = re.compile(
+    r"\b(?:qur'?an|koran|surah?)\s+(?P<surah>\d{1,3})\s*(?::|,?\s*(?:ayah|ayat|aya|verse|v\.?)\s*)\s*" + _VERSE_RANGE,
+    re.IGNORECASE
+)
+# "Bukhari 1", "Sahih al-Bukhari #8", "bukhari hadith no. 13"
+_HADITH_REFERENCE = re.compile(
+    r"\b(?:sahih\s+)?(?:al-?\s*)?(?P<collection>bukhari)\s*(?:hadith\s*)?(?:#|no\.?|number)?\s*(?P<number>\d{1,5})\b",
+    re.IGNORECASE
+)
+# Asking about meaning, context or rulings needs the model, not just the text
+_EXPLANATION = re.compile(
+    r"\b(?:explain\w*|explanation|mean|means|meaning|interpret\w*|tafsir|tafseer|why|context|lesson\w*|"
+    r"understand\w*|significance|ruling|apply|teach\w*|commentary|elaborate)\b",
+    re.IGNORECASE
+)
+
+
+class Reference(NamedTuple):
+    source: str  # "quran" or a hadith collection, e.g. "bukhari"
+    # (surah, verse) for the Quran, (number,) for hadith
+    key: Tuple[int, ...]
+
+    @property
+    def citation(self) -> str:
+        if self.source == "quran":
+            return f"Quran {self.key[0]}:{self.key[1]}"
+        return f"{self.source.capitalize()} {self.key[0]}"
+
+
+class ReferenceTable:
+    """Every verse and hadith in the data files, keyed by reference"""
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        # Reference -> (heading, text)
+        self.entries: Dict[Reference, Tuple[str, str]] = {}
+        self._load_quran(os.path.join(data_dir, QURAN_FILE))
+        for collection, fname in HADITH_FILES.items():
+            self._load_hadith(collection, os.path.join(data_dir, fname))
+
+    def _load_quran(self, path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            blocks = f.read().strip().split("\n\n")
+        for block in blocks:
+            lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+            match = _SURAH_HEADING.match(lines[0]) if lines else None
+            if not match:
+                continue
+            surah, start = int(match["surah"]), int(match["start"])
+            end = int(match["end"] or start)
+            heading = f"Surah {match['name']} ({match['meaning']})"
+            if match["title"]:
+                heading += f", {match['title']}"
+            verses = lines[1:]
+            if len(verses) == end - start + 1:
+                for offset, verse in enumerate(verses):
+                    self.entries[Reference("quran", (surah, start + offset))] = (heading, verse)
+            else:
+                # Line breaks don't follow verse boundaries; the passage answers for its first verse
+                self.entries[Reference("quran", (surah, start))] = (heading, "\n".join(verses))
+
+    def _load_hadith(self, collection: str, path: str):
+        if not os.path.exists(path):
+            return
+        book = None
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                heading = _BOOK_HEADING.match(line)
+                if heading:
+                    book = heading["book"]
+                    continue
+                match = _HADITH_NUMBER.search(line)
+                if match:
+                    text = line[:match.start()].strip()
+                    title = f"{HADITH_NAMES[collection]}, {book}" if book else HADITH_NAMES[collection]
+                    self.entries[Reference(collection, (int(match["number"]),))] = (title, text)
+
+    def lookup(self, reference: Reference) -> Optional[Tuple[str, str]]:
+        return self.entries.get(reference)
+
+
+def find_references(question: str) -> List[Reference]:
+    """Explicit Quran and hadith references in question, in order, without duplicates"""
+    found = []
+    for match in _QURAN_REFERENCE.finditer(question):
+        surah, start = int(match["surah"]), int(match["start"])
+        end = int(match["end"] or start)
+        found.extend((match.start(), Reference("quran", (surah, verse)))
+                     # One past the limit is enough for the caller to turn the range down
+                     for verse in range(start, min(end, start + MAX_REFERENCES) + 1))
+    for match in _HADITH_REFERENCE.finditer(question):
+        found.append((match.start(), Reference(match["collection"].lower(), (int(match["number"]),))))
+    found.sort(key=lambda item: item[0])
+    return list(dict.fromkeys(reference for _, reference in found))
+
+
+def wants_explanation(question: str) -> bool:
+    return _EXPLANATION.search(question) is not None
+
+
+reference_table = component("reference_table", ReferenceTable, shared=True)
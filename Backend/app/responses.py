@@ -0,0 +1,166 @@
+"""
+Cached, compressed JSON responses for versioned payloads.
+
+Session lists and message pages can run to megabytes. The session manager
+versions them (see SessionManager._changed), so a response is identified by
+its version: the version doubles as a weak ETag, and a client that already
+holds it gets 304 before anything is loaded or serialized. Otherwise the
+body is encoded with orjson when installed, compressed with brotli or gzip
+per Accept-Encoding once it reaches COMPRESS_MIN_BYTES, and kept in a
+bounded LRU keyed by version and encoding, so repeat requests from other
+tabs or devices skip both steps.
+"""
+import asyncio
+import gzip
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.metrics import registry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies are sent uncompressed; compression wouldn't pay for its CPU time
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Memory budget for encoded response bodies
+RESPONSE_CACHE_BYTES = int(float(os.getenv("RESPONSE_CACHE_MB", "32")) * 1024 * 1024)
+
+# Versions restart with the process, so ETags carry a per-process tag too
+_PROCESS_TAG = uuid.uuid4().hex[:8]
+
+cache_hits_total = registry.counter(
+    "cache_hits_total", "Cache lookups that found an entry", ("cache",))
+cache_misses_total = registry.counter(
+    "cache_misses_total", "Cache lookups that missed", ("cache",))
+response_bytes = registry.counter(
+    "json_response_bytes_total", "Versioned JSON response bytes before and after compression", ("stage",))
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Best content coding the client accepts: br, then gzip, else identity"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    for coding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return "identity"
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def etag_for(version: int) -> str:
+    return f'W/"{_PROCESS_TAG}-{version}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored on both sides
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+class ResponseCache:
+    """Encoded response bodies in least-recently-used order, bounded by total size"""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, body: bytes, encoding: str):
+        if len(body) > self.max_bytes // 4:
+            return  # one huge body shouldn't flush everything else
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._entries[key] = (body, encoding)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+
+response_cache = ResponseCache()
+
+
+def _encode(build: Callable[[], object], wanted: str):
+    body = dumps(build())
+    response_bytes.inc(len(body), "raw")
+    encoding = "identity"
+    if wanted != "identity" and len(body) >= COMPRESS_MIN_BYTES:
+        body, encoding = compress(body, wanted), wanted
+    response_bytes.inc(len(body), "encoded")
+    return body, encoding
+
+
+async def versioned_json(request: Request, key: Hashable, version: int, build: Callable[[], object]) -> Response:
+    """
+    JSON response for the payload build() returns, which must be fully determined
+    by key and version. Answers 304 when the client's If-None-Match matches.
+    On a cache miss build() runs, with encoding, in a worker thread, so it may read from disk.
+    """
+    etag = etag_for(version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding, Authorization"}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    wanted = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    cache_key = (key, version, wanted)
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        cache_misses_total.inc(1, "response")
+        body, encoding = await asyncio.to_thread(_encode, build, wanted)
+        response_cache.put(cache_key, body, encoding)
+    else:
+        cache_hits_total.inc(1, "response")
+        body, encoding = entry
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
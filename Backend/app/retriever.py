@@ -1,14 +1,39 @@
 import os
 import re
 from collections import Counter
+from app.components import component
+from app.normalize import normalize
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
+# Topic -> keywords that indicate it, shared with the per-user stats classifier.
+# Spelling variants (salat, namaz, roza, ...) are folded by app.normalize.
+KEYWORD_MAPPINGS = {
+    'prayer': ['prayer', 'salah', 'rakat', 'rakah', 'worship', 'fajr', 'dhuhr', 'asr', 'maghrib', 'isha', 'sujud', 'ruku'],
+    'fasting': ['fasting', 'fast', 'ramadan', 'sawm', 'iftar', 'suhoor', 'tarawih'],
+    'zakat': ['zakat', 'charity', 'sadaqah', 'poor', 'wealth', 'money', 'donation', 'nisab', 'fitrah'],
+    'hajj': ['hajj', 'pilgrimage', 'mecca', 'kaaba', 'umrah', 'tawaf', 'saee', 'arafat', 'muzdalifah', 'jamarat'],
+    'wudu': ['wudu', 'ablution', 'purification', 'wash', 'clean', 'taharah', 'ghusl', 'tayammum'],
+    'quran': ['quran', 'surah', 'ayat', 'verse', 'revelation', 'recitation', 'memorization'],
+    'hadith': ['hadith', 'prophet', 'muhammad', 'sunnah', 'narration', 'bukhari', 'muslim', 'tirmidhi'],
+    'islam': ['islam', 'muslim', 'faith', 'religion', 'belief', 'iman', 'tawheed', 'shahada'],
+    'fiqh': ['fiqh', 'jurisprudence', 'halal', 'haram', 'fatwa', 'ruling', 'hanafi', 'shafi', 'maliki', 'hanbali'],
+    'seerah': ['seerah', 'biography', 'prophet life', 'migration', 'hijra', 'medina', 'mecca']
+}
+# The same keywords in the form normalize() produces, for matching normalized text
+NORMALIZED_KEYWORDS = {
+    topic: sorted({normalize(keyword) for keyword in keywords})
+    for topic, keywords in KEYWORD_MAPPINGS.items()
+}
+
+
 class EnhancedRetriever:
     """Enhanced retriever that searches local Islamic knowledge files"""
     
     def __init__(self):
         self.knowledge_base = self._build_knowledge_base()
+        # Matched against normalized questions; normalized once here, not per query
+        self.normalized_entries = [normalize(entry) for entry in self.knowledge_base]
         self.keyword_mappings = self._get_keyword_mappings()
         print(f"✅ EnhancedRetriever initialized with {len(self.knowledge_base)} knowledge entries")
     
@@ -67,29 +92,17 @@ class EnhancedRetriever:
     
     def _get_keyword_mappings(self):
         """Define keyword mappings for better retrieval"""
-        return {
-            'prayer': ['prayer', 'salah', 'namaz', 'salat', 'rakat', 'rakah', 'worship', 'fajr', 'dhuhr', 'asr', 'maghrib', 'isha', 'sujud', 'ruku'],
-            'fasting': ['fasting', 'fast', 'ramadan', 'sawm', 'roza', 'iftar', 'suhoor', 'sehri', 'tarawih'],
-            'zakat': ['zakat', 'charity', 'sadaqah', 'poor', 'wealth', 'money', 'donation', 'nisab', 'fitrah'],
-            'hajj': ['hajj', 'pilgrimage', 'mecca', 'kaaba', 'umrah', 'tawaf', 'saee', 'arafat', 'muzdalifah', 'jamarat'],
-            'wudu': ['wudu', 'ablution', 'purification', 'wash', 'clean', 'taharat', 'ghusl', 'tayammum'],
-            'quran': ['quran', 'koran', 'surah', 'ayat', 'verse', 'revelation', 'recitation', 'memorization'],
-            'hadith': ['hadith', 'prophet', 'muhammad', 'sunnah', 'narration', 'bukhari', 'muslim', 'tirmidhi'],
-            'islam': ['islam', 'muslim', 'faith', 'religion', 'belief', 'iman', 'tawheed', 'shahada'],
-            'fiqh': ['fiqh', 'jurisprudence', 'halal', 'haram', 'fatwa', 'ruling', 'hanafi', 'shafi', 'maliki', 'hanbali'],
-            'seerah': ['seerah', 'biography', 'prophet life', 'migration', 'hijra', 'medina', 'mecca']
-        }
+        return NORMALIZED_KEYWORDS
     
     def search_local_knowledge(self, question, max_results=5):
         """Search local knowledge base for relevant answers"""
-        question_lower = question.lower()
+        question_lower = normalize(question)
         question_words = set(re.findall(r'\b\w+\b', question_lower))
         
         scored_results = []
         
-        for entry in self.knowledge_base:
+        for entry, entry_lower in zip(self.knowledge_base, self.normalized_entries):
             score = 0
-            entry_lower = entry.lower()
             
             # Exact word matching
             for word in question_words:
@@ -132,4 +145,8 @@ class EnhancedRetriever:
             "📖 fiqh_hanafi.txt\nFive Pillars of Islam: Shahadah (Faith), Salah (Prayer), Zakat (Charity), Sawm (Fasting), Hajj (Pilgrimage).",
             "📖 fiqh_hanafi.txt\nPrayer Times: Fajr (dawn), Dhuhr (midday), Asr (afternoon), Maghrib (sunset), Isha (night).",
             "📖 seerah.txt\nThe Prophet Muhammad (peace be upon him) was born in Mecca in 570 CE. Received first revelation at age 40. Hijra to Medina in 622 CE."
-        ]
\ No newline at end of file
+        ]
+
+
+# Read-only, so it is built before forking when gunicorn preloads the app
+knowledge_index = component("knowledge_index", EnhancedRetriever, shared=True)
@@ -0,0 +1,136 @@
+"""
+Fair scheduler for LLM generation.
+
+Callers wait for one of LLM_CONCURRENCY generation slots. Waiting requests
+are ordered by fair queuing: each user is a flow, every request advances its
+flow's virtual finish time by one, and the request with the smallest finish
+time runs next, so one user with many queued requests cannot crowd out
+everybody else. Requests whose deadline passes or whose client disconnects
+while queued are dropped before they reach the model.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.metrics import registry
+from app.profiling import span
+
+logger = logging.getLogger(__name__)
+
+# Generation calls allowed to run at once in this worker
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+# How often a queued request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+queue_wait_seconds = registry.histogram(
+    "scheduler_queue_wait_seconds", "Time spent waiting for a generation slot")
+dropped_total = registry.counter(
+    "scheduler_dropped_total", "Queued requests dropped before generation, by reason", ("reason",))
+queued = registry.gauge(
+    "scheduler_queued", "Requests waiting for a generation slot")
+running = registry.gauge(
+    "scheduler_running", "Generation calls in progress")
+
+
+class RequestDropped(Exception):
+    """Raised when a queued request passes its deadline or its client goes away"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class FairScheduler:
+    def __init__(self, concurrency: int = LLM_CONCURRENCY):
+        self.concurrency = concurrency
+        self._heap = []
+        self._sequence = itertools.count()
+        # user -> virtual finish time of that user's last request
+        self._finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._running = 0
+        queued.set_function(lambda: sum(1 for entry in self._heap if not entry[2].done()))
+        running.set_function(lambda: self._running)
+
+    def _dispatch(self):
+        while self._running < self.concurrency and self._heap:
+            finish, _, waiter = heapq.heappop(self._heap)
+            if waiter.done():
+                continue  # dropped while queued
+            self._virtual_time = finish
+            self._running += 1
+            waiter.set_result(None)
+
+    def _release(self):
+        self._running -= 1
+        self._dispatch()
+
+    async def _acquire(self, user_id: str, deadline: Optional[float],
+                       is_disconnected: Optional[Callable[[], Awaitable[bool]]]):
+        if len(self._finish) > 2 * len(self._heap) + 1024:
+            # Flows at or behind virtual time are idle; forgetting them changes nothing
+            self._finish = {f: t for f, t in self._finish.items() if t > self._virtual_time}
+        finish = max(self._virtual_time, self._finish.get(user_id, 0.0)) + 1
+        self._finish[user_id] = finish
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._sequence), waiter))
+        self._dispatch()
+        try:
+            while not waiter.done():
+                timeout = DISCONNECT_POLL_SECONDS if is_disconnected else None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RequestDropped("deadline")
+                    timeout = min(timeout, remaining) if timeout else remaining
+                await asyncio.wait([waiter], timeout=timeout)
+                if not waiter.done() and is_disconnected and await is_disconnected():
+                    raise RequestDropped("disconnected")
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # granted concurrently with the drop; hand the slot on
+            else:
+                waiter.cancel()
+            if self._finish.get(user_id) == finish:
+                del self._finish[user_id]
+            raise
+
+    def slot(self, user_id: str, timeout: Optional[float] = None,
+             is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        """
+        Async context manager holding a generation slot. Raises RequestDropped if
+        timeout seconds pass, or is_disconnected() turns true, before a slot frees up.
+        """
+        return _Slot(self, user_id, timeout, is_disconnected)
+
+
+class _Slot:
+    def __init__(self, scheduler: FairScheduler, user_id, timeout, is_disconnected):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.is_disconnected = is_disconnected
+
+    async def __aenter__(self):
+        started = time.monotonic()
+        try:
+            with span("queue_wait"):
+                await self.scheduler._acquire(self.user_id, self.deadline, self.is_disconnected)
+        except RequestDropped as e:
+            dropped_total.inc(1, e.reason)
+            logger.info(f"Dropped queued request for {self.user_id}: {e.reason}")
+            raise
+        finally:
+            queue_wait_seconds.observe(time.monotonic() - started)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.scheduler._release()
+        return False
+
+
+scheduler = FairScheduler()
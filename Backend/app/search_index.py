@@ -0,0 +1,171 @@
+"""
+Per-user inverted index over conversation messages.
+
+Each user's index is built from storage the first time they search and is
+then kept current by SessionManager as messages are added or sessions are
+deleted, so a query only touches the postings of its own terms.
+"""
+import heapq
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from app.normalize import word_spans, words
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "please should so than that the this to was what when where which who why will with you your".split()
+)
+
+# Characters of context shown on each side of the first match in a snippet
+SNIPPET_CONTEXT = 60
+
+# A message is identified by (session_id, message_index)
+DocKey = Tuple[str, int]
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in words(text) if len(t) > 1 and t not in STOPWORDS]
+
+
+def highlight(content: str, terms: Iterable[str]):
+    """Return a snippet around the first match and [start, end] offsets of matched terms in it"""
+    terms = set(terms)
+    spans = [(start, end) for _, start, end in word_spans(content, terms)]
+    if not spans:
+        return content[:2 * SNIPPET_CONTEXT], []
+    start = max(0, spans[0][0] - SNIPPET_CONTEXT)
+    end = min(len(content), spans[0][1] + SNIPPET_CONTEXT)
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end < len(content) else ""
+    offset = len(prefix) - start
+    highlights = [[s + offset, e + offset] for s, e in spans if s >= start and e <= end]
+    return prefix + content[start:end] + suffix, highlights
+
+
+class UserIndex:
+    """Postings for one user's messages: term -> session_id -> message index -> tf"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, Dict[int, int]]] = {}
+        # session_id -> terms it contributed, so a deleted session is unindexed without a scan
+        self.session_terms: Dict[str, set] = {}
+        self.session_docs: Dict[str, int] = {}
+        self.doc_count = 0
+
+    def add(self, session_id: str, index: int, content: str):
+        counts = Counter(tokenize(content))
+        if not counts:
+            return
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {}).setdefault(session_id, {})[index] = tf
+        self.session_terms.setdefault(session_id, set()).update(counts)
+        self.session_docs[session_id] = self.session_docs.get(session_id, 0) + 1
+        self.doc_count += 1
+
+    def remove_session(self, session_id: str):
+        for term in self.session_terms.pop(session_id, ()):
+            sessions = self.postings.get(term)
+            if sessions is None:
+                continue
+            sessions.pop(session_id, None)
+            if not sessions:
+                del self.postings[term]
+        self.doc_count -= self.session_docs.pop(session_id, 0)
+
+    def search(self, terms: List[str], limit: int) -> List[Tuple[float, DocKey]]:
+        """Rank messages by tf-idf, favouring messages that contain every query term"""
+        scores: Dict[DocKey, float] = {}
+        matched: Dict[DocKey, int] = {}
+        total = max(self.doc_count, 1)
+        for term in set(terms):
+            sessions = self.postings.get(term)
+            if not sessions:
+                continue
+            df = sum(len(docs) for docs in sessions.values())
+            idf = math.log(1 + total / df)
+            for session_id, docs in sessions.items():
+                for index, tf in docs.items():
+                    key = (session_id, index)
+                    scores[key] = scores.get(key, 0.0) + (1 + math.log(tf)) * idf
+                    matched[key] = matched.get(key, 0) + 1
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: (matched[item[0]], item[1]))
+        return [(score, key) for key, score in ranked]
+
+
+class _Build:
+    """A user's index being built: messages added meanwhile, replayed when it is published"""
+
+    def __init__(self):
+        self.added: List[Tuple[str, int, str]] = []
+        self.done = threading.Event()
+
+
+class SearchIndex:
+    """
+    Lazily built per-user indexes. The owner serialises calls with its own lock,
+    except build(), which reads storage and runs unlocked between start_build()
+    and finish_build().
+    """
+
+    def __init__(self):
+        self.users: Dict[str, UserIndex] = {}
+        self._builds: Dict[str, _Build] = {}
+
+    def is_built(self, user_id: str) -> bool:
+        return user_id in self.users
+
+    def start_build(self, user_id: str):
+        """Begin a build for user_id; returns None if one is running already (see wait_build)"""
+        if user_id in self._builds:
+            return None
+        build = self._builds[user_id] = _Build()
+        return build
+
+    def wait_build(self, user_id: str, timeout: float = None):
+        build = self._builds.get(user_id)
+        if build is not None:
+            build.done.wait(timeout)
+
+    @staticmethod
+    def build(sessions: Iterable[Tuple[str, List[str]]]) -> Tuple[UserIndex, Dict[str, int]]:
+        """Index (session_id, contents) pairs; also returns how many messages of each were indexed"""
+        index = UserIndex()
+        indexed = {}
+        for session_id, contents in sessions:
+            for i, content in enumerate(contents):
+                index.add(session_id, i, content)
+            indexed[session_id] = len(contents)
+        return index, indexed
+
+    def finish_build(self, user_id: str, build: _Build, index: UserIndex, indexed: Dict[str, int]):
+        """Publish a built index, adding the messages it missed; a no-op if the user was dropped meanwhile"""
+        try:
+            if self._builds.get(user_id) is not build:
+                return
+            del self._builds[user_id]
+            for session_id, i, content in build.added:
+                if i >= indexed.get(session_id, 0):
+                    index.add(session_id, i, content)
+            self.users[user_id] = index
+        finally:
+            build.done.set()
+
+    def add_message(self, user_id: str, session_id: str, index: int, content: str):
+        user_index = self.users.get(user_id)
+        if user_index is not None:
+            user_index.add(session_id, index, content)
+        elif user_id in self._builds:
+            self._builds[user_id].added.append((session_id, index, content))
+
+    def remove_session(self, user_id: str, session_id: str):
+        user_index = self.users.get(user_id)
+        if user_index is not None:
+            user_index.remove_session(session_id)
+
+    def drop_user(self, user_id: str):
+        self.users.pop(user_id, None)
+        build = self._builds.pop(user_id, None)
+        if build is not None:
+            build.done.set()
@@ -1,37 +1,155 @@
+import gzip
+import io
+import itertools
 import json
+import re
+import sys
+import time
 import uuid
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, NamedTuple
 import os
+from app.metrics import registry
+from app.persistence import WriteBehindWriter, atomic_write_json
+from app.search_index import SearchIndex, tokenize, highlight
+from app.blob_store import BlobStore, BLOB_MIN_CHARS
+from app.user_stats import UserStatsIndex, classify_topics
+
+# Default and maximum page size for paginated message retrieval
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Memory budget for message bodies held in RAM; least recently used sessions beyond it are archived
+HOT_MEMORY_LIMIT = int(float(os.getenv("SESSION_HOT_MEMORY_MB", "256")) * 1024 * 1024)
+# Rough per-message overhead on top of the content (tuple, float, list slot, str header)
+MESSAGE_OVERHEAD_BYTES = 160
+
+
+evictions_total = registry.counter(
+    "session_evictions_total", "Sessions whose messages were evicted to the cold archive")
+rehydrations_total = registry.counter(
+    "session_rehydrations_total", "Sessions whose messages were read back from the cold archive")
+rehydration_seconds_total = registry.counter(
+    "session_rehydration_seconds_total", "Time spent reading sessions back from the cold archive")
+cache_hits_total = registry.counter(
+    "cache_hits_total", "Cache lookups that found an entry", ("cache",))
+cache_misses_total = registry.counter(
+    "cache_misses_total", "Cache lookups that missed", ("cache",))
+hot_sessions = registry.gauge(
+    "session_hot_sessions", "Sessions with messages held in memory")
+hot_bytes = registry.gauge(
+    "session_hot_bytes", "Estimated bytes of message bodies held in memory")
+
+
+def _message_bytes(message) -> int:
+    return len(message.content) + MESSAGE_OVERHEAD_BYTES
+
+
+class _Prefix(io.RawIOBase):
+    """The first size bytes of an open file; whatever is appended later stays unread"""
+
+    def __init__(self, f, size: int):
+        self._f = f
+        self._left = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._f.readinto(memoryview(buffer)[:self._left])
+        self._left -= n
+        return n
+
+
+def archive_dir_name(user_id: str) -> str:
+    """Directory under archive_dir holding a user's compressed logs"""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", user_id.replace("@", "_at_"))
+
+
+class Message(NamedTuple):
+    """A stored message: interned role, content and an epoch-seconds timestamp"""
+    role: str
+    content: str
+    timestamp: float
+
+    @classmethod
+    def create(cls, role: str, content: str, timestamp: float = None):
+        return cls(sys.intern(role), content, time.time() if timestamp is None else timestamp)
+
+    @classmethod
+    def from_record(cls, record):
+        """Build from a stored [role, content, ts] row or a legacy message dict"""
+        if isinstance(record, dict):
+            timestamp = record.get("timestamp")
+            try:
+                timestamp = datetime.fromisoformat(timestamp).timestamp()
+            except (TypeError, ValueError):
+                timestamp = 0.0
+            return cls.create(record.get("role", "user"), record.get("content", ""), timestamp)
+        role, content, timestamp = record
+        return cls.create(role, content, timestamp)
+
+    def to_dict(self):
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+
+
+class LogOp(NamedTuple):
+    """A non-message entry queued on a session's log (action is "archive" or "delete")"""
+    action: str
+    user_id: str
+
 
 class Session:
+    __slots__ = ("id", "user_id", "name", "created_at", "updated_at",
+                 "messages", "message_count", "user_message_count", "preview", "topics", "version")
+
     def __init__(self, session_id=None, name=None, user_id=None):
         self.id = session_id or str(uuid.uuid4())
         self.user_id = user_id or "unknown"
         self.name = name or "New Conversation"
         self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
-        self.messages = []
+        self.updated_at = self.created_at
+        # Message bodies are loaded lazily; None means "not loaded yet"
+        self.messages: Optional[List[Message]] = None
         self.message_count = 0
+        # Counted incrementally; None when read from an index that predates it
+        self.user_message_count = 0
         self.preview = "No messages yet"
+        # topic -> number of user messages about it; None when read from an index that predates it
+        self.topics: Optional[Dict[str, int]] = {}
+        # Bumped by SessionManager whenever what the API returns for the session changes
+        self.version = 0
+
+    @property
+    def messages_loaded(self):
+        return self.messages is not None
+
+    def count_topics(self, topics):
+        for topic in topics:
+            self.topics[topic] = self.topics.get(topic, 0) + 1
 
-    def add_message(self, role: str, content: str):
-        self.messages.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+    def add_message(self, role: str, content: str, topics=()):
+        message = Message.create(role, content)
+        self.messages.append(message)
         self.message_count = len(self.messages)
-        self.updated_at = datetime.now().isoformat()
+        self.updated_at = datetime.fromtimestamp(message.timestamp).isoformat()
 
         # On the very first user message, rename the session to that question
         if role == "user":
-            user_messages = [m for m in self.messages if m["role"] == "user"]
-            if len(user_messages) == 1:
+            self.user_message_count += 1
+            if self.user_message_count == 1:
                 # Rename session to first question (max 40 chars)
                 self.name = content[:40] + "..." if len(content) > 40 else content
             # Always update preview with latest user message
             self.preview = content[:50] + "..." if len(content) > 50 else content
+            self.count_topics(topics)
+        return message
 
     def to_dict(self):
         return {
@@ -44,6 +162,13 @@ class Session:
             "preview": self.preview
         }
 
+    def to_index_dict(self):
+        """Metadata as persisted in the index (adds internal counters)"""
+        data = self.to_dict()
+        data["user_message_count"] = self.user_message_count
+        data["topics"] = self.topics
+        return data
+
     def to_full_dict(self):
         return {
             "id": self.id,
@@ -51,19 +176,84 @@ class Session:
             "name": self.name,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
-            "messages": self.messages,
+            "messages": [m.to_dict() for m in self.messages or []],
             "message_count": self.message_count
         }
 
 
 class SessionManager:
-    def __init__(self, storage_file="sessions.json"):
+    """
+    Sessions are stored in two parts:
+    - storage_file: a metadata index (name, preview, counts, timestamps) loaded eagerly
+    - messages_dir: one append-only JSONL file of messages per session, loaded on demand
+    - archive_dir: gzip-compressed logs of cold sessions, one directory per user
+    - blobs_dir: long message bodies, stored once per distinct text and referenced by hash
+    Writes are applied in memory immediately and persisted by a write-behind writer.
+    Loaded messages form a hot set bounded by hot_memory_limit; the least recently
+    used sessions are evicted to the archive and read back on next access.
+    """
+
+    INDEX_KEY = ("index",)
+
+    def __init__(self, storage_file="sessions.json", messages_dir=None, sync: bool = None,
+                 archive_dir=None, blobs_dir=None, hot_memory_limit: int = HOT_MEMORY_LIMIT):
         self.storage_file = storage_file
+        base = os.path.splitext(storage_file)[0]
+        self.messages_dir = messages_dir or base + "_messages"
+        self.archive_dir = archive_dir or base + "_archive"
+        self.blobs = BlobStore(blobs_dir or base + "_blobs")
         self.sessions: Dict[str, Session] = {}
+        # user_id -> set of session ids, so per-user lookups don't scan every session
+        self.user_sessions: Dict[str, set] = {}
+        # session_id -> estimated bytes, in least-recently-used order
+        self.hot: "OrderedDict[str, int]" = OrderedDict()
+        self.hot_bytes = 0
+        self.hot_memory_limit = hot_memory_limit
+        # Guards in-memory state against the writer thread taking a snapshot
+        self._lock = threading.RLock()
+        # Serialises log reads against the writer moving logs into the archive
+        self._io_lock = threading.Lock()
+        os.makedirs(self.messages_dir, exist_ok=True)
+        self.writer = WriteBehindWriter("sessions", self._flush, sync=sync)
+        self.search_index = SearchIndex()
+        self.stats = UserStatsIndex()
+        # Versions come from one counter, so they are unique across sessions and users
+        self._versions = itertools.count(1)
+        # user_id -> version of the user's session list
+        self.user_versions: Dict[str, int] = {}
+        hot_sessions.set_function(lambda: len(self.hot))
+        hot_bytes.set_function(lambda: self.hot_bytes)
         self.load_sessions()
 
+    def _messages_path(self, session_id: str):
+        return os.path.join(self.messages_dir, f"{session_id}.jsonl")
+
+    def _archive_path(self, user_id: str, session_id: str):
+        return os.path.join(self.archive_dir, archive_dir_name(user_id), f"{session_id}.jsonl.gz")
+
+    def _changed(self, session: Session):
+        """Give the session, and its user's session list, a new version"""
+        session.version = self.user_versions[session.user_id] = next(self._versions)
+
+    def _index_session(self, session: Session):
+        self.sessions[session.id] = session
+        self.user_sessions.setdefault(session.user_id, set()).add(session.id)
+        self.stats.add_session(session)
+        self._changed(session)
+
+    def _unindex_session(self, session: Session):
+        if self.sessions.pop(session.id, None) is not None:
+            self.stats.remove_session(session)
+            self._changed(session)
+        ids = self.user_sessions.get(session.user_id)
+        if ids is not None:
+            ids.discard(session.id)
+            if not ids:
+                del self.user_sessions[session.user_id]
+
     def load_sessions(self):
-        """Load sessions from file"""
+        """Load session metadata from file (message bodies stay on disk)"""
+        migrated = False
         try:
             if os.path.exists(self.storage_file):
                 with open(self.storage_file, 'r') as f:
@@ -76,38 +266,296 @@ class SessionManager:
                         session.updated_at = session_data.get("updated_at", session.updated_at)
                         session.message_count = session_data.get("message_count", 0)
                         session.preview = session_data.get("preview", "")
-                        session.messages = session_data.get("messages", [])
-                        self.sessions[session_id] = session
+                        session.user_message_count = session_data.get("user_message_count")
+                        session.topics = session_data.get("topics")
+                        # Legacy format kept messages inline; move them to the message log
+                        if "messages" in session_data:
+                            self._migrate_inline_messages(session, session_data["messages"])
+                            migrated = True
+                        self._index_session(session)
         except Exception as e:
             print(f"Error loading sessions: {e}")
+        if migrated:
+            self.save_sessions()
 
-    def save_sessions(self):
-        """Save sessions to file"""
+    def _migrate_inline_messages(self, session: Session, messages: list):
+        path = self._messages_path(session.id)
+        if not os.path.exists(path):
+            with open(path, 'w') as f:
+                for message in messages:
+                    f.write(self._encode_row(Message.from_record(message)) + "\n")
+        session.message_count = len(messages)
+        session.user_message_count = sum(1 for m in messages if m.get("role") == "user")
+        session.topics = {}
+        for message in messages:
+            if message.get("role") == "user":
+                session.count_topics(classify_topics(message.get("content", "")))
+
+    def _encode_row(self, message: Message) -> str:
+        """Serialise a message for its log, moving long bodies into the blob store"""
+        if len(message.content) >= BLOB_MIN_CHARS:
+            return json.dumps([message.role, {"blob": self.blobs.put(message.content)}, message.timestamp])
+        return json.dumps(message)
+
+    def _decode_row(self, line: str) -> Message:
+        record = json.loads(line)
+        if isinstance(record, list) and isinstance(record[1], dict):
+            role, ref, timestamp = record
+            return Message.create(role, self.blobs.get(ref["blob"]), timestamp)
+        message = Message.from_record(record)
+        if len(message.content) >= BLOB_MIN_CHARS:
+            message = message._replace(content=self.blobs.intern(message.content))
+        return message
+
+    def _load_messages(self, session: Session):
+        """Return a session's messages, reading its archive and log on first access"""
+        if session.messages_loaded:
+            cache_hits_total.inc(1, "session")
+            self._touch(session)
+            return session.messages
+        cache_misses_total.inc(1, "session")
+        messages = self._read_messages(session)
+        session.messages = messages
+        session.message_count = len(messages)
+        if session.user_message_count is None:
+            session.user_message_count = sum(1 for m in messages if m.role == "user")
+        if session.topics is None:
+            self._classify(session, messages)
+        self._touch(session, sum(_message_bytes(m) for m in messages))
+        return messages
+
+    def _classify(self, session: Session, messages: List[Message]):
+        """Fill in topic counts for a session indexed before they were tracked"""
+        topics = {}
+        for message in messages:
+            if message.role == "user":
+                for topic in classify_topics(message.content):
+                    topics[topic] = topics.get(topic, 0) + 1
+        session.topics = topics
+        self.stats.classified(session)
+        self.save_sessions()
+
+    def _peek_messages(self, session: Session):
+        """Return a session's messages without pulling them into the hot set"""
+        if session.messages_loaded:
+            return session.messages
+        return self._read_messages(session)
+
+    def _read_messages(self, session: Session):
+        """Read a session's messages from its archive and log"""
+        # An archive move may still be queued, or being written, for this session
+        self.writer.flush_key(("messages", session.id))
+        messages = []
+        path = self._messages_path(session.id)
+        archive_path = self._archive_path(session.user_id, session.id)
         try:
-            data = {}
-            for session_id, session in self.sessions.items():
-                data[session_id] = {
-                    "id": session.id,
-                    "user_id": session.user_id,
-                    "name": session.name,
-                    "created_at": session.created_at,
-                    "updated_at": session.updated_at,
-                    "message_count": session.message_count,
-                    "preview": session.preview,
-                    "messages": session.messages
-                }
-            with open(self.storage_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._io_lock:
+                if os.path.exists(archive_path):
+                    started = time.monotonic()
+                    with gzip.open(archive_path, 'rt') as f:
+                        messages.extend(self._decode_row(line) for line in f if line.strip())
+                    rehydrations_total.inc()
+                    rehydration_seconds_total.inc(time.monotonic() - started)
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        messages.extend(self._decode_row(line) for line in f if line.strip())
         except Exception as e:
-            print(f"Error saving sessions: {e}")
+            print(f"Error loading messages for session {session.id}: {e}")
+        return messages
+
+    def iter_messages(self, session: Session):
+        """Yield a session's messages one at a time, streaming from disk if it is not loaded"""
+        if session.messages_loaded:
+            messages = session.messages
+            for i in range(len(messages)):
+                yield messages[i]
+            return
+        self.writer.flush_key(("messages", session.id))
+        files = []
+        with self._io_lock:
+            # Each file is read up to its size now, so an archive move while streaming
+            # can't yield the log's lines twice, nor a later flush a half-written line
+            for path, compressed in ((self._archive_path(session.user_id, session.id), True),
+                                     (self._messages_path(session.id), False)):
+                if os.path.exists(path):
+                    f = open(path, 'rb')
+                    files.append((f, os.fstat(f.fileno()).st_size, compressed))
+        try:
+            for f, size, compressed in files:
+                stream = io.BufferedReader(_Prefix(f, size))
+                if compressed:
+                    stream = gzip.GzipFile(fileobj=stream)
+                for line in io.TextIOWrapper(stream, encoding="utf-8"):
+                    if line.strip():
+                        yield self._decode_row(line)
+        finally:
+            for f, _, _ in files:
+                f.close()
+
+    def _touch(self, session: Session, added_bytes: int = 0):
+        """Mark a loaded session as most recently used and enforce the memory budget"""
+        with self._lock:
+            self.hot[session.id] = self.hot.get(session.id, 0) + added_bytes
+            self.hot.move_to_end(session.id)
+            self.hot_bytes += added_bytes
+            if self.hot_bytes > self.hot_memory_limit:
+                self._evict_cold(keep=session.id)
+        self.writer.commit()
+
+    def _evict_cold(self, keep: str):
+        """Drop least recently used message lists until the hot set fits its budget"""
+        for session_id in list(self.hot):
+            if self.hot_bytes <= self.hot_memory_limit:
+                break
+            if session_id == keep:
+                continue
+            size = self.hot.pop(session_id)
+            self.hot_bytes -= size
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            session.messages = None
+            self.writer.enqueue(("messages", session_id), LogOp("archive", session.user_id))
+            evictions_total.inc()
+
+    def _forget_hot(self, session_id: str):
+        with self._lock:
+            size = self.hot.pop(session_id, 0)
+            self.hot_bytes -= size
+
+    def _archive_log(self, session_id: str, user_id: str):
+        """Append a session's plain log to its compressed archive as a new gzip member"""
+        path = self._messages_path(session_id)
+        if not os.path.exists(path):
+            return
+        archive_path = self._archive_path(user_id, session_id)
+        with self._io_lock:
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            with open(path, 'rb') as src, gzip.open(archive_path, 'ab') as dst:
+                dst.write(src.read())
+            os.remove(path)
+
+    @staticmethod
+    def _blob_refs(path: str) -> List[str]:
+        """Hashes of the blobs a log's rows refer to, one per row"""
+        refs = []
+        with (gzip.open(path, 'rt') if path.endswith(".gz") else open(path, 'r')) as f:
+            for line in f:
+                if '"blob"' in line:
+                    record = json.loads(line)
+                    if isinstance(record, list) and isinstance(record[1], dict):
+                        refs.append(record[1]["blob"])
+        return refs
+
+    def _remove_logs(self, session_id: str, user_id: str):
+        """Remove a session's log and archive, then release the blobs their rows referred to"""
+        refs = []
+        with self._io_lock:
+            for path in (self._messages_path(session_id), self._archive_path(user_id, session_id)):
+                try:
+                    path_refs = self._blob_refs(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    # Never written, or removed by another worker that releases its blobs
+                    continue
+                refs.extend(path_refs)
+        # Only once the rows are gone, so a crash in between leaks blobs rather than losing them
+        self.blobs.release(refs)
+
+    def _flush(self, batch: dict):
+        """
+        Writer callback: append queued messages, archive or remove logs, rewrite the index.
+        Work is removed from batch as it is written, so if this raises the writer
+        requeues only what is left and a retry never appends a line twice.
+        """
+        for key in [k for k in batch if k != self.INDEX_KEY]:
+            session_id, payloads = key[1], batch[key]
+            deletes = [i for i, p in enumerate(payloads) if isinstance(p, LogOp) and p.action == "delete"]
+            if deletes:
+                # Anything queued before the last deletion is moot
+                del payloads[:deletes[-1]]
+            while payloads:
+                # The messages up to the next log operation, then that operation
+                end = next((i for i, p in enumerate(payloads) if isinstance(p, LogOp)), len(payloads))
+                self._append_lines(session_id, [self._encode_row(p) + "\n" for p in payloads[:end]])
+                if end < len(payloads):
+                    op = payloads[end]
+                    if op.action == "delete":
+                        self._remove_logs(session_id, op.user_id)
+                    else:
+                        self._archive_log(session_id, op.user_id)
+                    end += 1
+                del payloads[:end]
+            del batch[key]
+        if self.INDEX_KEY in batch:
+            self._write_index()
+            del batch[self.INDEX_KEY]
+
+    def _append_lines(self, session_id: str, lines: list):
+        if lines:
+            with self._io_lock, open(self._messages_path(session_id), 'a') as f:
+                f.writelines(lines)
+
+    def _write_index(self):
+        with self._lock:
+            data = {session_id: session.to_index_dict() for session_id, session in self.sessions.items()}
+        atomic_write_json(self.storage_file, data, indent=2)
+
+    def save_sessions(self):
+        """Schedule a write of the session metadata index"""
+        self.writer.enqueue(self.INDEX_KEY)
+        self.writer.commit()
+
+    def flush(self):
+        """Write all pending changes now"""
+        self.writer.flush()
 
     def create_session(self, user_id: str, name=None):
         """Create a new session for a specific user"""
         session = Session(name=name, user_id=user_id)
-        self.sessions[session.id] = session
+        session.messages = []
+        with self._lock:
+            self._index_session(session)
+        self._touch(session)
         self.save_sessions()
         return session.id
 
+    def import_session(self, user_id: str, name=None, created_at=None, updated_at=None):
+        """Create an empty session from exported metadata without loading it into the hot set"""
+        session = Session(name=name, user_id=user_id)
+        session.created_at = created_at or session.created_at
+        session.updated_at = updated_at or session.created_at
+        with self._lock:
+            self._index_session(session)
+        self.save_sessions()
+        return session
+
+    def import_messages(self, session: Session, messages: List[Message]):
+        """Append already-timestamped messages, e.g. from an import, in one batch"""
+        if not messages:
+            return
+        topics = []
+        with self._lock:
+            for message in messages:
+                self.writer.enqueue(("messages", session.id), message)
+                self.search_index.add_message(session.user_id, session.id, session.message_count, message.content)
+                session.message_count += 1
+                if message.role == "user":
+                    session.user_message_count = (session.user_message_count or 0) + 1
+                    content = message.content
+                    session.preview = content[:50] + "..." if len(content) > 50 else content
+                    message_topics = classify_topics(content)
+                    if session.topics is not None:
+                        session.count_topics(message_topics)
+                    topics.extend(message_topics)
+            if session.messages_loaded:
+                session.messages.extend(messages)
+            self.stats.add_messages(session, len(messages), topics)
+            self._changed(session)
+        if session.messages_loaded:
+            self._touch(session, sum(_message_bytes(m) for m in messages))
+        self.save_sessions()
+
     def get_session(self, session_id: str, user_id: str = None):
         """Get a session by ID — optionally verify it belongs to user_id"""
         session = self.sessions.get(session_id)
@@ -118,9 +566,15 @@ class SessionManager:
             return None
         return session
 
+    def session_ids(self, user_id: str) -> List[str]:
+        """A snapshot of user_id's session ids, safe to iterate while sessions change"""
+        with self._lock:
+            return list(self.user_sessions.get(user_id, ()))
+
     def get_all_sessions(self, user_id: str):
         """Get all sessions belonging to a specific user, sorted by updated_at"""
-        sessions = [s for s in self.sessions.values() if s.user_id == user_id]
+        with self._lock:
+            sessions = [self.sessions[sid] for sid in self.user_sessions.get(user_id, ())]
         sessions.sort(key=lambda s: s.updated_at, reverse=True)
         return [s.to_dict() for s in sessions]
 
@@ -129,25 +583,168 @@ class SessionManager:
         session = self.sessions.get(session_id)
         if not session or session.user_id != user_id:
             return False
-        del self.sessions[session_id]
+        with self._lock:
+            self._unindex_session(session)
+            self._forget_hot(session_id)
+            self.search_index.remove_session(user_id, session_id)
+        self.writer.enqueue(("messages", session_id), LogOp("delete", user_id))
         self.save_sessions()
         return True
 
+    def delete_user_sessions(self, user_id: str, progress=None, batch_size: int = 500,
+                             created_before: str = None) -> int:
+        """
+        Delete every session of user_id, found through the per-user index, in batches.
+        The log removals and the index rewrite are persisted by a single flush.
+        progress, if given, is called with (deleted, total) after each batch.
+        created_before (an ISO timestamp) limits it to sessions created earlier.
+        """
+        session_ids = self.session_ids(user_id)
+        if created_before is not None:
+            with self._lock:
+                session_ids = [sid for sid in session_ids
+                               if sid in self.sessions and self.sessions[sid].created_at < created_before]
+        total = len(session_ids)
+        for start in range(0, total, batch_size):
+            with self._lock:
+                for session_id in session_ids[start:start + batch_size]:
+                    session = self.sessions.get(session_id)
+                    if session is None:
+                        continue
+                    self._unindex_session(session)
+                    self._forget_hot(session_id)
+                    self.writer.enqueue(("messages", session_id), LogOp("delete", user_id))
+            if progress:
+                progress(min(start + batch_size, total), total)
+        with self._lock:
+            self.search_index.drop_user(user_id)
+            if user_id not in self.user_sessions:
+                self.user_versions.pop(user_id, None)
+        self.save_sessions()
+        self.writer.flush()
+        try:
+            os.rmdir(os.path.dirname(self._archive_path(user_id, "")))
+        except OSError:
+            pass  # never archived, or not empty
+        return total
+
     def add_message(self, session_id: str, role: str, content: str, user_id: str = None):
         """Add a message to a session"""
         session = self.get_session(session_id, user_id=user_id)
         if session:
-            session.add_message(role, content)
+            topics = classify_topics(content) if role == "user" else []
+            while True:
+                self._load_messages(session)
+                with self._lock:
+                    # Eviction runs under _lock, so the list can only have gone before we took it
+                    if not session.messages_loaded:
+                        continue
+                    message = session.add_message(role, self.blobs.intern(content), topics)
+                    self.stats.add_messages(session, 1, topics)
+                    self._changed(session)
+                    self.search_index.add_message(session.user_id, session_id, session.message_count - 1, content)
+                    break
+            self.writer.enqueue(("messages", session_id), message)
+            self._touch(session, _message_bytes(message))
             self.save_sessions()
             return True
         return False
 
     def get_messages(self, session_id: str, user_id: str = None, limit: int = None):
-        """Get messages from a session"""
+        """Get messages from a session as dicts"""
         session = self.get_session(session_id, user_id=user_id)
         if session:
-            messages = session.messages
+            messages = self._load_messages(session)
             if limit:
                 messages = messages[-limit:]
-            return messages
-        return []
\ No newline at end of file
+            return [m.to_dict() for m in messages]
+        return []
+
+    def get_message_page(self, session_id: str, user_id: str = None, before: int = None, limit: int = DEFAULT_PAGE_SIZE):
+        """
+        Get one page of messages ending just before the `before` cursor (a message index).
+        With no cursor the latest page is returned. Returns (messages, next_before), where
+        next_before is the cursor for the previous page or None when there is nothing older.
+        """
+        session = self.get_session(session_id, user_id=user_id)
+        if not session:
+            return [], None
+        messages = self._load_messages(session)
+        limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+        end = len(messages) if before is None else max(0, min(before, len(messages)))
+        start = max(0, end - limit)
+        return [m.to_dict() for m in messages[start:end]], (start if start > 0 else None)
+
+    def get_user_stats(self, user_id: str):
+        """A user's chat, message and topic counters (see app.user_stats)"""
+        stats = self.stats.get(user_id)
+        if stats.unclassified:
+            for session_id in stats.unclassified:
+                session = self.sessions.get(session_id)
+                if session is not None and session.topics is None:
+                    self._classify(session, self._peek_messages(session))
+            # Read again for the topics just classified
+            stats = self.stats.get(user_id)
+        return stats
+
+    def _build_search_index(self, user_id: str):
+        """
+        Index a user's stored messages. Reading them happens outside _lock; messages
+        added meanwhile are recorded by the search index and replayed when it is published.
+        """
+        with self._lock:
+            if self.search_index.is_built(user_id):
+                return
+            build = self.search_index.start_build(user_id)
+            sessions = [self.sessions[sid] for sid in self.user_sessions.get(user_id, ())]
+        if build is None:
+            # Another request is building it
+            self.search_index.wait_build(user_id)
+            return
+        try:
+            index, indexed = self.search_index.build(
+                (s.id, [m.content for m in self._peek_messages(s)]) for s in sessions
+            )
+        except BaseException:
+            # Forget the half-built index so the next search starts over
+            with self._lock:
+                self.search_index.drop_user(user_id)
+            raise
+        with self._lock:
+            self.search_index.finish_build(user_id, build, index, indexed)
+
+    def search(self, user_id: str, query: str, limit: int = 20):
+        """Full-text search over a user's messages, best matches first, with highlighted snippets"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if not self.search_index.is_built(user_id):
+            self._build_search_index(user_id)
+        # Messages are indexed, and accounts dropped, on other threads under _lock
+        with self._lock:
+            user_index = self.search_index.users.get(user_id)
+            hits = user_index.search(terms, limit) if user_index is not None else []
+        read_cache = {}
+        results = []
+        for score, (session_id, index) in hits:
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            if session_id not in read_cache:
+                read_cache[session_id] = self._peek_messages(session)
+            messages = read_cache[session_id]
+            if index >= len(messages):
+                continue
+            message = messages[index]
+            snippet, highlights = highlight(message.content, terms)
+            results.append({
+                "session_id": session_id,
+                "session_name": session.name,
+                "message_index": index,
+                "role": message.role,
+                "timestamp": datetime.fromtimestamp(message.timestamp).isoformat(),
+                "score": round(score, 4),
+                "snippet": snippet,
+                "highlights": highlights
+            })
+        return results
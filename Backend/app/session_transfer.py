@@ -0,0 +1,130 @@
+"""
+NDJSON export and import of a user's sessions.
+
+The format is one JSON object per line: a "session" line with the session's
+metadata, followed by one "message" line per message of that session.
+Both directions stream, so memory use does not depend on history size.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterator
+
+from app.session_manager import SessionManager, Message
+
+# Bytes of NDJSON collected before a chunk is handed to the response
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Messages written per import batch; the event loop is released between batches
+IMPORT_BATCH_SIZE = 1000
+# Lines longer than this are rejected instead of buffered
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class ImportFormatError(ValueError):
+    """Raised for malformed import input"""
+
+
+def _session_records(manager: SessionManager, session) -> Iterator[dict]:
+    yield {"type": "session", **session.to_dict()}
+    for message in manager.iter_messages(session):
+        yield {
+            "type": "message",
+            "session_id": session.id,
+            "role": message.role,
+            "content": message.content,
+            "timestamp": datetime.fromtimestamp(message.timestamp).isoformat()
+        }
+
+
+def export_ndjson(manager: SessionManager, user_id: str) -> Iterator[bytes]:
+    """Yield a user's sessions and messages as NDJSON, in chunks of about EXPORT_CHUNK_BYTES"""
+    buffer = []
+    size = 0
+    # Snapshot the ids up front so concurrent creates/deletes don't break iteration
+    for session_id in manager.session_ids(user_id):
+        session = manager.get_session(session_id, user_id=user_id)
+        if session is None:
+            continue
+        for record in _session_records(manager, session):
+            line = (json.dumps(record) + "\n").encode()
+            buffer.append(line)
+            size += len(line)
+            if size >= EXPORT_CHUNK_BYTES:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering more than one line"""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+        if len(pending) > MAX_LINE_BYTES:
+            raise ImportFormatError("Line too long")
+    if pending:
+        yield pending
+
+
+async def import_ndjson(manager: SessionManager, user_id: str, lines: AsyncIterator[bytes]) -> dict:
+    """
+    Import NDJSON produced by export_ndjson into new sessions owned by user_id.
+    Messages are written in batches, releasing the event loop and draining the
+    write-behind queue between batches so memory stays flat.
+    """
+    sessions = {}
+    current = None
+    batch = []
+    imported_messages = 0
+    skipped = 0
+
+    async def write_batch():
+        nonlocal batch
+        if current is not None and batch:
+            manager.import_messages(current, batch)
+        batch = []
+        await asyncio.to_thread(manager.flush)
+
+    async for raw in lines:
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+            kind = record.get("type")
+        except (ValueError, AttributeError):
+            skipped += 1
+            continue
+        if kind == "session":
+            await write_batch()
+            current = manager.import_session(
+                user_id,
+                name=record.get("name"),
+                created_at=record.get("created_at"),
+                updated_at=record.get("updated_at")
+            )
+            sessions[record.get("id")] = current
+        elif kind == "message":
+            target = sessions.get(record.get("session_id"))
+            if target is None or record.get("role") not in ("user", "bot") or not isinstance(record.get("content"), str):
+                skipped += 1
+                continue
+            if target is not current:
+                await write_batch()
+                current = target
+            batch.append(Message.from_record(record))
+            imported_messages += 1
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await write_batch()
+        else:
+            skipped += 1
+    await write_batch()
+
+    return {
+        "sessions": len(sessions),
+        "messages": imported_messages,
+        "skipped": skipped
+    }
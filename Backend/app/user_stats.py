@@ -0,0 +1,113 @@
+"""
+Per-user conversation statistics kept up to date as sessions change.
+
+SessionManager reports every session it indexes or drops and every message
+it adds, so the profile stats endpoints read counters from memory instead of
+scanning a user's sessions. Topic counts come from classifying each user
+message against the retriever's keyword mappings; each session keeps its own
+topic counts in the session index so they survive restarts and can be
+subtracted again when the session is deleted.
+"""
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.normalize import normalize
+from app.retriever import NORMALIZED_KEYWORDS
+
+# Number of topics reported as a user's favourites
+FAVORITE_TOPICS = 5
+
+_TOPIC_PATTERNS = [
+    (topic, re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b"))
+    for topic, keywords in NORMALIZED_KEYWORDS.items()
+]
+
+
+def classify_topics(text: str) -> List[str]:
+    """Topics whose keywords appear in text"""
+    text = normalize(text)
+    return [topic for topic, pattern in _TOPIC_PATTERNS if pattern.search(text)]
+
+
+class UserStats:
+    __slots__ = ("chats", "messages", "topics", "last_active", "unclassified")
+
+    def __init__(self):
+        self.chats = 0
+        self.messages = 0
+        self.topics = Counter()
+        self.last_active: Optional[str] = None
+        # Sessions loaded from an index that predates topic counts; classified on first read
+        self.unclassified = set()
+
+    def favorite_topics(self, limit: int = FAVORITE_TOPICS) -> List[str]:
+        return [topic.title() for topic, count in self.topics.most_common(limit) if count > 0]
+
+
+class UserStatsIndex:
+    def __init__(self):
+        self.users: Dict[str, UserStats] = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, user_id: str) -> UserStats:
+        stats = self.users.get(user_id)
+        if stats is None:
+            stats = self.users[user_id] = UserStats()
+        return stats
+
+    def add_session(self, session):
+        with self._lock:
+            stats = self._stats(session.user_id)
+            stats.chats += 1
+            stats.messages += session.message_count
+            if session.topics is None:
+                stats.unclassified.add(session.id)
+            else:
+                stats.topics.update(session.topics)
+            if stats.last_active is None or session.updated_at > stats.last_active:
+                stats.last_active = session.updated_at
+
+    def remove_session(self, session):
+        with self._lock:
+            stats = self.users.get(session.user_id)
+            if stats is None:
+                return
+            stats.chats -= 1
+            stats.messages -= session.message_count
+            if session.id in stats.unclassified:
+                stats.unclassified.discard(session.id)
+            elif session.topics:
+                stats.topics.subtract(session.topics)
+            if stats.chats <= 0:
+                del self.users[session.user_id]
+
+    def add_messages(self, session, count: int, topics: List[str] = ()):
+        """Count messages just added to session; topics are those of its user messages"""
+        with self._lock:
+            stats = self._stats(session.user_id)
+            stats.messages += count
+            if session.id not in stats.unclassified:
+                stats.topics.update(topics)
+            if stats.last_active is None or session.updated_at > stats.last_active:
+                stats.last_active = session.updated_at
+
+    def classified(self, session):
+        """Add the topics of a session that was unclassified until now"""
+        with self._lock:
+            stats = self.users.get(session.user_id)
+            if stats is not None and session.id in stats.unclassified:
+                stats.unclassified.discard(session.id)
+                stats.topics.update(session.topics)
+
+    def get(self, user_id: str) -> UserStats:
+        """A copy of user_id's counters, consistent even while other threads update them"""
+        copy = UserStats()
+        with self._lock:
+            stats = self.users.get(user_id)
+            if stats is not None:
+                copy.chats, copy.messages, copy.last_active = stats.chats, stats.messages, stats.last_active
+                copy.topics = Counter(stats.topics)
+                copy.unclassified = set(stats.unclassified)
+        return copy
@@ -0,0 +1,111 @@
+"""
+SQLite storage for user records.
+
+One row per user keyed by email, holding the user dict as JSON. WAL mode lets
+every gunicorn worker read concurrently while writes take a short immediate
+transaction, so updates from different workers never clobber each other.
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+USERS_DB_PATH = os.getenv("USERS_DB_PATH", "users.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+)
+"""
+
+
+class SqliteUserStore:
+    def __init__(self, path: str = USERS_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # sqlite3 connections must stay on the thread that opened them
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, email: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def emails(self):
+        return [row[0] for row in self._connect().execute("SELECT email FROM users")]
+
+    def apply(self, operations: Dict[str, Iterable[Tuple[str, Optional[dict]]]]):
+        """
+        Apply queued operations for many users in one transaction. Each operation is
+        ("put", full_record), ("patch", fields) or ("delete", None); patches are merged
+        into the stored row so concurrent workers updating different fields both win.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for email, ops in operations.items():
+                record = None
+                loaded = False
+                for action, data in ops:
+                    if action == "put":
+                        record, loaded = dict(data), True
+                    elif action == "delete":
+                        record, loaded = None, True
+                    elif action == "patch":
+                        if not loaded:
+                            record, loaded = self._get_in_tx(conn, email), True
+                        if record is not None:
+                            record.update(data)
+                if not loaded:
+                    continue
+                if record is None:
+                    conn.execute("DELETE FROM users WHERE email = ?", (email,))
+                else:
+                    conn.execute(
+                        "INSERT INTO users (email, data) VALUES (?, ?) "
+                        "ON CONFLICT(email) DO UPDATE SET data = excluded.data",
+                        (email, json.dumps(record))
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _get_in_tx(conn, email):
+        row = conn.execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def import_json(self, users_file: str) -> int:
+        """One-shot migration from a users.json dict; existing rows are left untouched"""
+        with open(users_file, 'r') as f:
+            users = json.load(f)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (email, data) VALUES (?, ?)",
+                ((email, json.dumps(data)) for email, data in users.items())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return conn.total_changes - before
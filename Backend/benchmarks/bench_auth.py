@@ -0,0 +1,70 @@
+"""
+Per-request authentication overhead.
+
+Times get_current_user for a valid token with the verified-token and
+user-record caches disabled (the previous behaviour: HMAC, base64/JSON
+decode and a store lookup on every request) and enabled.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_auth [--requests 50000] [--users 1000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault("USERS_DB_PATH", os.path.join(TMP, "module.db"))
+
+from app import auth  # noqa: E402
+
+
+async def time_requests(tokens, requests):
+    rng = random.Random(3)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await auth.get_current_user(rng.choice(tokens))
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    auth.user_db = auth.UserDB(db_path=os.path.join(TMP, "users.db"), legacy_file=os.path.join(TMP, "none.json"))
+    tokens = []
+    for i in range(args.users):
+        email = f"user{i}@example.com"
+        auth.user_db.create_user(email, {
+            "email": email, "name": f"User {i}", "picture": "", "preferences": {},
+            "settings": {"theme": "light", "language": "en", "notifications": True, "font_size": "medium"}
+        })
+        tokens.append(auth.create_access_token({"sub": email}, timedelta(minutes=30)))
+    auth.user_db.flush()
+
+    cache_sizes = auth.TOKEN_CACHE_SIZE, auth.USER_CACHE_SIZE
+    auth.TOKEN_CACHE_SIZE = auth.USER_CACHE_SIZE = 0
+    uncached = asyncio.run(time_requests(tokens, args.requests))
+    auth.TOKEN_CACHE_SIZE, auth.USER_CACHE_SIZE = cache_sizes
+    cached = asyncio.run(time_requests(tokens, args.requests))
+    auth.user_db.writer.close()
+    shutil.rmtree(TMP, ignore_errors=True)
+
+    print(json.dumps({
+        "requests": args.requests,
+        "users": args.users,
+        "uncached_us_per_request": round(uncached * 1e6, 1),
+        "cached_us_per_request": round(cached * 1e6, 1),
+        "speedup": round(uncached / cached, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Blob store storage and memory report.
+
+Generates a production-shaped history: questions drawn with Zipf-like
+popularity, answers wrapped in the greeting and closing _clean_response adds,
+with popular questions getting one of a few near-identical answers. It then
+compares the legacy verbatim sessions.json layout with message logs backed
+by the blob store, with and without a trained shared dictionary.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_blob_store [--messages 20000] [--questions 300]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from app.blob_store import train_dictionary
+from app.session_manager import SessionManager
+
+PARAGRAPHS = [
+    "The scholars of the four schools agree that this act is established by the Quran and the Sunnah, "
+    "and the evidence for it is found in several authentic narrations in Sahih al-Bukhari and Sahih Muslim.",
+    "In the Hanafi school the ruling is stated in Al-Hidayah and Radd al-Muhtar, where the jurists explain "
+    "the conditions that must be met and the exceptions that apply in cases of hardship.",
+    "### Practical guidance\n*   Make a sincere intention before beginning.\n*   Consult a qualified "
+    "local scholar for circumstances specific to you.\n*   Be consistent, as the most beloved deeds to "
+    "Allah are those done regularly even if they are small.",
+    "The wisdom behind this ruling relates to the objectives of the Shariah (Maqasid), namely the "
+    "protection of faith, life, intellect, lineage and wealth.",
+    "Allah says in the Quran: \"Indeed, Allah is with the patient.\" (2:153) This reminds the believer "
+    "that hardship in fulfilling obligations carries great reward.",
+]
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        # The reference count database's WAL is transient and reset at each checkpoint
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files if not f.endswith(("-wal", "-shm")))
+    return total
+
+
+def make_answer(question, variant):
+    local = random.Random(f"{question}-{variant}")
+    body = "\n\n".join(local.sample(PARAGRAPHS, 3))
+    return f"As-salamu alaykum. Regarding {question.lower()}: {body}\n\nAnd Allah knows best."
+
+
+def generate(messages, questions, seed=11):
+    rng = random.Random(seed)
+    pool = [f"Question {i} about {rng.choice(['zakat', 'prayer', 'fasting', 'hajj', 'wudu', 'inheritance'])}"
+            for i in range(questions)]
+    weights = [1 / (rank + 1) for rank in range(questions)]
+    history = []
+    for _ in range(messages // 2):
+        question = rng.choices(pool, weights)[0]
+        history.append(("user", question))
+        history.append(("bot", make_answer(question, rng.randrange(3))))
+    return history
+
+
+def store(tmp, name, history, dictionary=None, per_session=20):
+    manager = SessionManager(os.path.join(tmp, f"{name}.json"))
+    if dictionary is not None:
+        manager.blobs.set_dictionary(dictionary)
+    session_id = None
+    for i, (role, content) in enumerate(history):
+        if i % per_session == 0:
+            session_id = manager.create_session(user_id="bench@example.com")
+        manager.add_message(session_id, role, content)
+    manager.writer.close()
+    resident = {id(m.content): len(m.content) for s in manager.sessions.values() for m in s.messages or []}
+    on_disk = sum(dir_size(os.path.join(tmp, f"{name}{suffix}")) for suffix in ("_messages", "_blobs"))
+    return on_disk + os.path.getsize(os.path.join(tmp, f"{name}.json")), sum(resident.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--questions", type=int, default=300)
+    args = parser.parse_args()
+
+    history = generate(args.messages, args.questions)
+    verbatim_chars = sum(len(content) for _, content in history)
+    legacy = {"s": {"messages": [{"role": r, "content": c, "timestamp": "2026-05-22T22:43:20.674988"}
+                                 for r, c in history]}}
+    legacy_bytes = len(json.dumps(legacy, indent=2).encode())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_bytes, resident_chars = store(tmp, "plain", history)
+        dictionary = train_dictionary(content for role, content in history[:2000] if role == "bot")
+        dict_bytes, _ = store(tmp, "dict", history, dictionary=dictionary)
+
+    print(json.dumps({
+        "messages": len(history),
+        "legacy_sessions_json_mb": round(legacy_bytes / 1e6, 2),
+        "blob_store_mb": round(plain_bytes / 1e6, 2),
+        "blob_store_with_dictionary_mb": round(dict_bytes / 1e6, 2),
+        "dictionary_bytes": len(dictionary),
+        "storage_reduction": round(legacy_bytes / dict_bytes, 1),
+        "message_text_in_memory_mb": {
+            "verbatim": round(verbatim_chars / 1e6, 2),
+            "deduplicated": round(resident_chars / 1e6, 2),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+NDJSON export/import memory benchmark.
+
+Builds a user with a large history on disk, streams it through export_ndjson
+and back through import_ndjson, and reports traced peak memory for each
+direction next to the size of the exported data.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_export_import [--messages 500000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.session_manager import SessionManager, Message
+from app.session_transfer import export_ndjson, import_ndjson, iter_lines
+
+USER = "bench@example.com"
+MESSAGES_PER_SESSION = 5000
+
+
+def seed(manager: SessionManager, messages: int):
+    """Write message logs directly so seeding a large history stays fast"""
+    now = time.time()
+    written = 0
+    while written < messages:
+        session = manager.import_session(USER, name=f"Session {written // MESSAGES_PER_SESSION}")
+        count = min(MESSAGES_PER_SESSION, messages - written)
+        with open(manager._messages_path(session.id), 'w') as f:
+            for i in range(count):
+                role = "user" if i % 2 == 0 else "bot"
+                f.write(json.dumps(Message(role, f"Message {written + i} about zakat and prayer " * 4, now)) + "\n")
+        session.message_count = count
+        written += count
+    manager.flush()
+
+
+async def read_chunks(path: str):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = SessionManager(os.path.join(tmp, "source.json"))
+        seed(source, args.messages)
+        export_path = os.path.join(tmp, "export.ndjson")
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        with open(export_path, 'wb') as f:
+            for chunk in export_ndjson(source, USER):
+                f.write(chunk)
+        export_seconds = time.perf_counter() - started
+        _, export_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        target = SessionManager(os.path.join(tmp, "target.json"))
+        tracemalloc.start()
+        started = time.perf_counter()
+        summary = asyncio.run(import_ndjson(target, USER, iter_lines(read_chunks(export_path))))
+        import_seconds = time.perf_counter() - started
+        _, import_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        export_mb = os.path.getsize(export_path) / 1e6
+        source.writer.close()
+        target.writer.close()
+
+    print(json.dumps({
+        "messages": args.messages,
+        "export_size_mb": round(export_mb, 1),
+        "export_seconds": round(export_seconds, 2),
+        "export_peak_mb": round(export_peak / 1e6, 2),
+        "import_seconds": round(import_seconds, 2),
+        "import_peak_mb": round(import_peak / 1e6, 2),
+        "imported": summary,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Login-storm benchmark for user storage.
+
+Several processes (standing in for gunicorn workers) each perform logins
+against a shared pool of users: read the record, then update name, picture,
+last_login and a per-worker login counter. Compares the legacy whole-file
+users.json rewrite with the SQLite UserDB, in synchronous and write-behind
+mode and with login metadata buffered through record_login, and counts
+updates that were lost to cross-worker overwrites.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_login_storm [--workers 4] [--logins 500] [--users 200]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+
+class LegacyUserDB:
+    """The previous implementation: whole users.json loaded per process and rewritten on every change"""
+
+    def __init__(self, users_file):
+        self.users_file = users_file
+        with open(users_file) as f:
+            self.users = json.load(f)
+
+    def get_user(self, email):
+        return self.users.get(email)
+
+    def update_user(self, email, user_data):
+        self.users[email].update(user_data)
+        with open(self.users_file, 'w') as f:
+            json.dump(self.users, f, indent=2)
+
+
+def seed_users(path, users):
+    records = {
+        f"user{i}@example.com": {
+            "email": f"user{i}@example.com", "name": f"User {i}", "picture": "",
+            "created_at": datetime.now().isoformat(), "last_login": "", "preferences": {},
+            "settings": {"theme": "light", "language": "en", "notifications": True, "font_size": "medium"}
+        }
+        for i in range(users)
+    }
+    with open(path, 'w') as f:
+        json.dump(records, f, indent=2)
+
+
+def open_db(backend, tmp):
+    if backend == "legacy":
+        return LegacyUserDB(os.path.join(tmp, "users.json"))
+    from app.auth import UserDB
+    return UserDB(db_path=os.path.join(tmp, "users.db"),
+                  legacy_file=os.path.join(tmp, "users.json"),
+                  sync=(backend == "sqlite-sync"))
+
+
+def writes_avoided():
+    from app.auth import user_writes_avoided_total
+    return user_writes_avoided_total.get()
+
+
+def worker(backend, tmp, worker_id, logins, users, start_event):
+    db = open_db(backend, tmp)
+    rng = random.Random(worker_id)
+    counts = {}
+    start_event.wait()
+    for _ in range(logins):
+        email = f"user{rng.randrange(users)}@example.com"
+        user = db.get_user(email)
+        counts[email] = counts.get(email, 0) + 1
+        login = db.record_login if backend == "sqlite-login-buffered" else db.update_user
+        login(email, {
+            "name": user["name"],
+            "picture": f"https://example.com/{worker_id}.png",
+            "last_login": datetime.now().isoformat(),
+            f"logins_w{worker_id}": counts[email],
+        })
+    if hasattr(db, "writer"):
+        db.writer.close()
+        return counts, writes_avoided()
+    return counts, 0
+
+
+def final_records(backend, tmp):
+    if backend == "legacy":
+        with open(os.path.join(tmp, "users.json")) as f:
+            return json.load(f)
+    from app.user_store import SqliteUserStore
+    store = SqliteUserStore(os.path.join(tmp, "users.db"))
+    return {email: store.get(email) for email in store.emails()}
+
+
+def run(backend, workers, logins, users):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep app.auth's module-level UserDB out of the working directory
+        os.environ["USERS_DB_PATH"] = os.path.join(tmp, "module.db")
+        seed_users(os.path.join(tmp, "users.json"), users)
+        open_db(backend, tmp)  # performs the one-time import for SQLite backends
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as manager:
+            start_event = manager.Event()
+            with ctx.Pool(workers) as pool:
+                pending = [pool.apply_async(worker, (backend, tmp, w, logins, users, start_event))
+                           for w in range(workers)]
+                time.sleep(1)
+                started = time.perf_counter()
+                start_event.set()
+                results, avoided = zip(*(p.get() for p in pending))
+                elapsed = time.perf_counter() - started
+        records = final_records(backend, tmp)
+        lost = sum(
+            1
+            for w, counts in enumerate(results)
+            for email, count in counts.items()
+            if (records.get(email) or {}).get(f"logins_w{w}") != count
+        )
+        return {
+            "logins_per_second": round(workers * logins / elapsed, 1),
+            "lost_updates": lost,
+            "writes_avoided": int(sum(avoided)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    report = {"workers": args.workers, "logins_per_worker": args.logins, "users": args.users}
+    for backend in ("legacy", "sqlite-sync", "sqlite-login-buffered"):
+        report[backend] = run(backend, args.workers, args.logins, args.users)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
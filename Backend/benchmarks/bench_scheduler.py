@@ -0,0 +1,72 @@
+"""
+Generation scheduler fairness report.
+
+Simulates a worker whose model calls take a fixed time: two users flood the
+queue with questions, and a crowd of light users each ask one question
+shortly after.
+Reports the light users' queue wait under plain first-come-first-served
+(a semaphore, the previous behaviour) and under FairScheduler.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_scheduler [--flood 200] [--light 40] [--llm-ms 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.scheduler import FairScheduler
+
+CONCURRENCY = 4
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def scenario(make_slot, flood, light, llm_seconds):
+    waits = {"light": [], "flood": []}
+
+    async def request(kind, user):
+        started = time.monotonic()
+        async with make_slot(user):
+            waits[kind].append(time.monotonic() - started)
+            await asyncio.sleep(llm_seconds)
+
+    tasks = [asyncio.create_task(request("flood", user)) for user in ("chatty-user", "script-user")
+             for _ in range(flood)]
+    await asyncio.sleep(llm_seconds * 2)
+    tasks += [asyncio.create_task(request("light", f"user{i}")) for i in range(light)]
+    await asyncio.gather(*tasks)
+    return {
+        kind: {"p50_ms": round(percentile(w, 50) * 1000), "p99_ms": round(percentile(w, 99) * 1000)}
+        for kind, w in waits.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flood", type=int, default=200)
+    parser.add_argument("--light", type=int, default=40)
+    parser.add_argument("--llm-ms", type=float, default=50)
+    args = parser.parse_args()
+    llm_seconds = args.llm_ms / 1000
+
+    async def fifo():
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        return await scenario(lambda user: semaphore, args.flood, args.light, llm_seconds)
+
+    async def fair():
+        scheduler = FairScheduler(concurrency=CONCURRENCY)
+        return await scenario(scheduler.slot, args.flood, args.light, llm_seconds)
+
+    print(json.dumps({
+        "concurrency": CONCURRENCY,
+        "fifo": asyncio.run(fifo()),
+        "fair": asyncio.run(fair()),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
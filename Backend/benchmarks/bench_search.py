@@ -0,0 +1,73 @@
+"""
+Conversation search latency benchmark.
+
+Fills one user's history with generated questions and answers, then reports
+index build time and per-query latency percentiles for SessionManager.search.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_search [--messages 5000] [--queries 500]
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+import os
+
+from app.session_manager import SessionManager
+
+TOPICS = ["zakat on gold", "fasting while travelling", "combining prayers", "wudu after sleep",
+          "hajj rites", "interest on savings", "inheritance shares", "tarawih rakat",
+          "nisab of silver", "sadaqah to relatives", "missed fasts", "friday prayer"]
+FILLER = ("the scholars mention that this depends on the intention and circumstances of the person "
+          "and evidence from the quran and sunnah supports the ruling").split()
+QUERIES = ["zakat gold", "fasting travelling", "prayers", "nisab silver", "inheritance", "wudu sleep"]
+
+USER = "bench@example.com"
+
+
+def fill(manager, messages, rng):
+    session_id = None
+    for i in range(0, messages, 2):
+        if i % 40 == 0:
+            session_id = manager.create_session(user_id=USER)
+        topic = rng.choice(TOPICS)
+        manager.add_message(session_id, "user", f"What is the ruling on {topic}?", user_id=USER)
+        answer = " ".join(rng.choice(FILLER) for _ in range(80))
+        manager.add_message(session_id, "bot", f"As-salamu alaykum. Regarding {topic}, {answer}.", user_id=USER)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = SessionManager(os.path.join(tmp, "sessions.json"))
+        fill(manager, args.messages, rng)
+
+        started = time.perf_counter()
+        manager.search(USER, "zakat")
+        build_ms = (time.perf_counter() - started) * 1000
+
+        latencies = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            manager.search(USER, QUERIES[i % len(QUERIES)])
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        manager.writer.close()
+
+    print(json.dumps({
+        "messages": args.messages,
+        "index_build_ms": round(build_ms, 2),
+        "query_p50_ms": round(statistics.median(latencies), 3),
+        "query_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
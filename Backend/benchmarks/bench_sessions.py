@@ -0,0 +1,106 @@
+"""
+Session memory and add_message benchmark.
+
+Reports bytes per stored message and the cost of Session.add_message once a
+session already holds N messages, for the current representation and for the
+previous dict-per-message layout.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_sessions [--messages 1000000]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from app.session_manager import Session
+
+CONTENTS = [
+    "What is the ruling on combining prayers while travelling?",
+    "As-salamu alaykum. Combining Dhuhr with Asr is permitted for the traveller...\n\nAnd Allah knows best.",
+    "How is zakat calculated on gold?",
+    "As-salamu alaykum. Zakat on gold is due once it reaches the nisab...\n\nAnd Allah knows best.",
+]
+
+
+class LegacySession:
+    """The previous layout: one dict per message and a history rescan per user message"""
+
+    def __init__(self):
+        self.messages = []
+        self.name = "New Conversation"
+
+    def add_message(self, role, content):
+        self.messages.append({
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now().isoformat()
+        })
+        if role == "user":
+            user_messages = [m for m in self.messages if m["role"] == "user"]
+            if len(user_messages) == 1:
+                self.name = content[:40]
+
+
+def fill(session, count):
+    roles = ("user", "bot")
+    if isinstance(session, LegacySession):
+        # Filling through the legacy add_message is quadratic, so build its messages directly
+        for i in range(count):
+            session.messages.append({
+                "role": roles[i & 1],
+                "content": CONTENTS[i & 3],
+                "timestamp": datetime.now().isoformat()
+            })
+        return
+    for i in range(count):
+        # Message contents come from a shared pool so only the container cost is measured
+        session.add_message(roles[i & 1], CONTENTS[i & 3])
+
+
+def bytes_per_message(factory, count):
+    gc.collect()
+    tracemalloc.start()
+    session = factory()
+    fill(session, count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return session, current / count
+
+
+def add_message_cost(session, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        session.add_message("user", CONTENTS[0])
+    return (time.perf_counter() - started) / calls
+
+
+def new_session():
+    session = Session(user_id="bench@example.com")
+    session.messages = []
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    results = {}
+    for label, factory, calls in (("current", new_session, 10_000), ("legacy", LegacySession, 20)):
+        session, per_message = bytes_per_message(factory, args.messages)
+        cost = add_message_cost(session, calls)
+        results[label] = {
+            "bytes_per_message": round(per_message, 1),
+            "add_message_us_at_n": round(cost * 1e6, 2),
+        }
+        del session
+        gc.collect()
+
+    print(json.dumps({"messages": args.messages, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Offline end-to-end load test for the API.
+
+Starts the backend in a scratch directory with the offline model (FAKE_LLM)
+and rate limits disabled, creates test accounts directly in its user store,
+mints their JWTs with create_access_token, and sends a mix of ask,
+list-sessions, get-session and stats requests at a target rate. Arrivals
+are open-loop (Poisson), so a slow server builds a queue instead of slowing
+the load down. A get-session for a user with no known session yet is sent
+as list-sessions instead. Prints throughput, error rates and p50/p95/p99 latency per
+endpoint as JSON. Nothing touches the network beyond localhost.
+
+To test a server that is already running, pass --url and --users-db (its
+USERS_DB_PATH). It must run with FAKE_LLM=1 and share this shell's SECRET_KEY.
+
+Usage (from Backend/):
+    python -m benchmarks.load_api [--rate 50] [--duration 30] [--users 200]
+        [--mix ask=2,list=4,get=3,stats=1] [--workers 1] [--llm-ms 800] [--output report.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("ask", "list", "get", "stats")
+QUESTIONS = [
+    "How do I perform wudu before prayer?",
+    "What is the nisab for zakat on savings?",
+    "Can I break my fast if I am travelling during Ramadan?",
+    "What are the pillars of Hajj?",
+    "Is it permissible to combine prayers while travelling?",
+    "What does the Quran say about patience?",
+    "How many rakat are in the Isha prayer?",
+    "Which hadith collections are considered most authentic?",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r} in --mix; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def create_users(users_db, count):
+    """Create test accounts straight in the user store and return their emails"""
+    from app.auth import UserDB
+    db = UserDB(db_path=users_db, legacy_file=os.path.join(os.path.dirname(users_db), "none.json"), sync=True)
+    emails = [f"load{i}@example.com" for i in range(count)]
+    for email in emails:
+        if db.get_user(email) is None:
+            db.create_user(email, {"email": email, "name": email.split("@")[0], "picture": None,
+                                   "created_at": "2025-01-01T00:00:00", "preferences": {}, "settings": {}})
+    db.writer.close()
+    return emails
+
+
+def start_server(workdir, port, workers, llm_ms):
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        FAKE_LLM="1",
+        FAKE_LLM_LATENCY_MS=str(llm_ms),
+        FAKE_LLM_JITTER_MS=str(llm_ms / 2),
+        ASK_USER_PER_MINUTE="0",
+        ASK_GLOBAL_PER_MINUTE="0",
+        USERS_DB_PATH=os.path.join(workdir, "users.db"),
+        RATE_LIMIT_DB_PATH=os.path.join(workdir, "rate_limits.db"),
+        DELETION_DB_PATH=os.path.join(workdir, "deletions.db"),
+        METRICS_DIR=os.path.join(workdir, "metrics"),
+        PROFILE_PICS_DIR=os.path.join(workdir, "profile_pics"),
+    )
+    if workers > 1:
+        command = ["gunicorn", "app.main:app", "--workers", str(workers),
+                   "--worker-class", "uvicorn.workers.UvicornWorker", "--bind", f"127.0.0.1:{port}",
+                   "--config", os.path.join(BACKEND_DIR, "gunicorn.conf.py")]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(client, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("Server did not become ready; see server.log in the scratch directory")
+
+
+class LoadRun:
+    def __init__(self, client, tokens, mix, max_in_flight):
+        self.client = client
+        self.tokens = tokens
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.client_dropped = 0
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.statuses = {name: Counter() for name in ENDPOINTS}
+        # email -> session ids seen for that user
+        self.sessions = {email: [] for email in tokens}
+
+    async def request(self, endpoint, email):
+        headers = {"Authorization": f"Bearer {self.tokens[email]}"}
+        known = self.sessions[email]
+        if endpoint == "get" and not known:
+            endpoint = "list"
+        started = time.perf_counter()
+        try:
+            if endpoint == "ask":
+                body = {"question": random.choice(QUESTIONS)}
+                if known and random.random() < 0.5:
+                    body["session_id"] = random.choice(known)
+                response = await self.client.post("/api/ask", json=body, headers=headers)
+                if response.status_code == 200:
+                    session_id = response.json().get("session_id")
+                    if session_id and session_id not in known:
+                        known.append(session_id)
+            elif endpoint == "list":
+                response = await self.client.get("/api/sessions", headers=headers)
+                if response.status_code == 200 and not known:
+                    known.extend(s["id"] for s in response.json().get("sessions", [])[:20] if "id" in s)
+            elif endpoint == "get":
+                response = await self.client.get(f"/api/sessions/{random.choice(known)}", headers=headers)
+            else:
+                response = await self.client.get("/api/profile/stats", headers=headers)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        self.statuses[endpoint][status] += 1
+
+    async def tracked(self, endpoint, email):
+        try:
+            await self.request(endpoint, email)
+        finally:
+            self.in_flight -= 1
+
+    async def drive(self, rate, duration):
+        emails = list(self.tokens)
+        tasks = set()
+        started = time.perf_counter()
+        next_arrival = started
+        while next_arrival - started < duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_arrival += random.expovariate(rate)
+            if self.in_flight >= self.max_in_flight:
+                self.client_dropped += 1
+                continue
+            self.in_flight += 1
+            endpoint = random.choices(self.endpoints, self.weights)[0]
+            task = asyncio.create_task(self.tracked(endpoint, random.choice(emails)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = errors = 0
+        for name in ENDPOINTS:
+            latencies = self.latencies[name]
+            if not latencies:
+                continue
+            failed = sum(n for status, n in self.statuses[name].items()
+                         if not isinstance(status, int) or status >= 400)
+            total += len(latencies)
+            errors += failed
+            endpoints[name] = {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / elapsed, 1),
+                "error_rate": round(failed / len(latencies), 4),
+                "statuses": {str(status): n for status, n in sorted(self.statuses[name].items(), key=str)},
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            }
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 1),
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "client_dropped": self.client_dropped,
+            "endpoints": endpoints,
+        }
+
+
+async def run(args, url, tokens):
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        await wait_ready(client)
+        load = LoadRun(client, tokens, parse_mix(args.mix), args.max_in_flight)
+        elapsed = await load.drive(args.rate, args.duration)
+        return load.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=50, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--mix", default="ask=2,list=4,get=3,stats=1", help="relative endpoint weights")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="arrivals beyond this are counted as client_dropped")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers for the spawned server; 1 runs uvicorn")
+    parser.add_argument("--llm-ms", type=float, default=800, help="mean latency of the offline model")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="drive an already running server instead of starting one")
+    parser.add_argument("--users-db", help="USERS_DB_PATH of the server given by --url")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    if args.url and not args.users_db:
+        parser.error("--url needs --users-db so test accounts can be created")
+
+    # The spawned server loads Backend/.env the same way, so both sides agree on SECRET_KEY
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"), override=True)
+    os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+    workdir = tempfile.mkdtemp(prefix="load_api_")
+    os.environ.setdefault("USERS_DB_PATH", os.path.join(workdir, "users.db"))
+    os.environ.setdefault("RATE_LIMIT_DB_PATH", os.path.join(workdir, "rate_limits.db"))
+    from app.auth import create_access_token
+
+    server = None
+    try:
+        users_db = args.users_db or os.path.join(workdir, "users.db")
+        emails = create_users(users_db, args.users)
+        tokens = {email: create_access_token({"sub": email}, timedelta(hours=2)) for email in emails}
+        url = args.url
+        if url is None:
+            server = start_server(workdir, args.port, args.workers, args.llm_ms)
+            url = f"http://127.0.0.1:{args.port}"
+        report = asyncio.run(run(args, url, tokens))
+        report["config"] = {
+            "rate": args.rate, "duration": args.duration, "users": args.users, "mix": args.mix,
+            "workers": None if args.url else args.workers, "llm_ms": None if args.url else args.llm_ms,
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
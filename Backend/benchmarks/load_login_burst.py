@@ -0,0 +1,70 @@
+"""
+Login-burst load test against a running backend.
+
+Start the server with the local OAuth stand-in, e.g.
+    FAKE_OAUTH=1 FAKE_OAUTH_LATENCY_MS=50 gunicorn app.main:app -k uvicorn.workers.UvicornWorker -w 4
+then drive the OAuth callback concurrently, as a burst of users returning
+from Google would, and report logins per second and latency percentiles.
+
+Usage (from Backend/):
+    python -m benchmarks.load_login_burst [--url http://localhost:8000] [--logins 2000] [--concurrency 100]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def burst(url, logins, concurrency, users):
+    latencies = []
+    failures = 0
+    next_login = 0
+
+    async def login_loop(client):
+        nonlocal next_login, failures
+        while next_login < logins:
+            i = next_login
+            next_login += 1
+            started = time.perf_counter()
+            response = await client.get(
+                "/api/auth/google/callback", params={"code": f"burst{i % users}@example.com"})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code not in (302, 307) or "token=" not in response.headers.get("location", ""):
+                failures += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(login_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "failures": failures,
+        "logins_per_second": round(logins / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=500, help="distinct accounts; the rest are returning logins")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(burst(args.url, args.logins, args.concurrency, args.users)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
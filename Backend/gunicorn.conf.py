@@ -0,0 +1,32 @@
+"""
+Gunicorn settings picked up automatically from the working directory.
+
+The app is imported once in the master, which builds the read-only shared
+components (see app.components); workers inherit them copy-on-write, and
+freezing the garbage collector first keeps collections in the workers from
+touching, and so copying, those pages. Stateful components are built in
+each worker's lifespan. Set GUNICORN_PRELOAD=0 to import in every worker
+instead.
+
+Workers share METRICS_DIR so /metrics reports the whole server rather than
+whichever worker answered the scrape. Snapshots from a previous run are
+cleared when the master starts.
+"""
+import gc
+import glob
+import os
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() not in ("0", "false", "no")
+
+os.environ.setdefault("METRICS_DIR", "/tmp/islamic-agent-metrics")
+
+
+def on_starting(server):
+    directory = os.environ["METRICS_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "metrics-*.json*")):
+        os.remove(path)
+
+
+def when_ready(server):
+    gc.freeze()
@@ -0,0 +1,31 @@
+"""
+One-shot migration of users.json into the SQLite user database.
+
+Rows that already exist in the database are left untouched, so the script is
+safe to re-run.
+
+Usage (from Backend/):
+    python -m scripts.migrate_users_to_sqlite [--source users.json] [--db users.db]
+"""
+import argparse
+import os
+
+from app.user_store import SqliteUserStore, USERS_DB_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="users.json")
+    parser.add_argument("--db", default=USERS_DB_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ {args.source} not found")
+        return
+    store = SqliteUserStore(args.db)
+    imported = store.import_json(args.source)
+    print(f"✅ Imported {imported} users into {args.db} ({store.count()} total)")
+
+
+if __name__ == "__main__":
+    main()
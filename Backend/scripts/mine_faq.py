@@ -0,0 +1,132 @@
+"""
+Build the FAQ store (app.faq) from session history.
+
+Reads the session index, logs and archives directly and read-only, so it is
+safe to run against a live server's storage: nothing is migrated, classified
+or rewritten. Each session's opening question is paired with the answer
+that followed it; later turns are skipped, since their answers depend on the
+conversation before them. Questions are grouped by their normalized form
+(app.faq.question_key). Groups asked by at least --min-users different users
+become FAQ entries, answered with the group's most common answer (the latest
+one on a tie). Failed replies are ignored.
+
+The server loads the store at start, so re-run this and restart to refresh.
+
+Usage (from Backend/):
+    python -m scripts.mine_faq [--sessions sessions.json] [--output faq.json]
+        [--min-users 2] [--max-entries 5000]
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from app.agent import FAILED_ANSWERS
+from app.blob_store import BlobStore
+from app.faq import FAQ_STORE_PATH, question_key
+from app.persistence import atomic_write_text
+from app.session_manager import Message, archive_dir_name
+
+# Variant spellings kept per entry
+MAX_VARIANTS = 10
+
+
+def opening_messages(index: dict, sessions_file: str):
+    """(user_id, first two messages) of every session in index, read without writing anything"""
+    base = os.path.splitext(sessions_file)[0]
+    blobs = BlobStore(base + "_blobs") if os.path.isdir(base + "_blobs") else None
+
+    def decode(line):
+        record = json.loads(line)
+        if isinstance(record, list) and isinstance(record[1], dict):
+            role, ref, timestamp = record
+            return Message.create(role, blobs.get(ref["blob"]), timestamp)
+        return Message.from_record(record)
+
+    def read(path, compressed):
+        with (gzip.open(path, 'rt') if compressed else open(path, 'r')) as f:
+            # A live server may be appending to the log; only whole leading lines are read
+            return [decode(line) for line in itertools.islice(f, 2) if line.endswith("\n") and line.strip()]
+
+    for session_id, data in index.items():
+        user_id = data.get("user_id", "unknown")
+        if "messages" in data:
+            # Legacy index with inline messages, not migrated yet
+            yield user_id, [Message.from_record(m) for m in data["messages"][:2]]
+            continue
+        messages = []
+        for path, compressed in ((os.path.join(base + "_archive", archive_dir_name(user_id), f"{session_id}.jsonl.gz"), True),
+                                 (os.path.join(base + "_messages", f"{session_id}.jsonl"), False)):
+            if len(messages) < 2 and os.path.exists(path):
+                try:
+                    messages.extend(read(path, compressed))
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️  Skipping {path}: {e}")
+        yield user_id, messages[:2]
+
+
+def question_answer_pairs(sessions):
+    """(user_id, question, answer) for each session that opens with an answered question"""
+    for user_id, messages in sessions:
+        if len(messages) < 2 or messages[0].role != "user" or messages[1].role == "user":
+            continue
+        question, answer = messages[0].content, messages[1].content
+        if not any(failed in answer for failed in FAILED_ANSWERS):
+            yield user_id, question, answer
+
+
+def mine(pairs, min_users: int, max_entries: int):
+    questions = defaultdict(Counter)
+    answers = defaultdict(Counter)
+    users = defaultdict(set)
+    # (key, answer) -> position of its latest occurrence, to break ties
+    latest = {}
+    for order, (user_id, question, answer) in enumerate(pairs):
+        key = question_key(question)
+        if not key:
+            continue
+        questions[key][question.strip()] += 1
+        answers[key][answer] += 1
+        users[key].add(user_id)
+        latest[(key, answer)] = order
+    entries = []
+    for key, asked in questions.items():
+        if len(users[key]) < min_users:
+            continue
+        answer = max(answers[key], key=lambda a: (answers[key][a], latest[(key, a)]))
+        spellings = [q for q, _ in asked.most_common()]
+        entries.append({
+            "question": spellings[0],
+            "variants": spellings[1:MAX_VARIANTS + 1],
+            "answer": answer,
+            "count": sum(asked.values()),
+            "users": len(users[key])
+        })
+    entries.sort(key=lambda entry: (-entry["count"], entry["question"]))
+    return entries[:max_entries]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="sessions.json", help="session index, as used by the server")
+    parser.add_argument("--output", default=FAQ_STORE_PATH)
+    parser.add_argument("--min-users", type=int, default=2, help="distinct users who must have asked a question")
+    parser.add_argument("--max-entries", type=int, default=5000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.sessions):
+        print(f"❌ {args.sessions} not found")
+        return
+    with open(args.sessions, 'r') as f:
+        index = json.load(f)
+    entries = mine(question_answer_pairs(opening_messages(index, args.sessions)), args.min_users, args.max_entries)
+    store = {"generated_at": datetime.now().isoformat(), "entries": entries}
+    atomic_write_text(args.output, json.dumps(store, ensure_ascii=False, separators=(",", ":")))
+    print(f"✅ Wrote {len(entries)} FAQ entries from {len(index)} sessions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,21 @@ export default function Chat({ isDarkMode, sessionId, onSessionUpdate }) {
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
   const [loadingSession, setLoadingSession] = useState(false);
+  const [nextBefore, setNextBefore] = useState(null);
+  const [loadingEarlier, setLoadingEarlier] = useState(false);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   };
 
   useEffect(() => {
+    // Don't jump to the bottom when older messages are prepended
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -27,6 +35,7 @@ export default function Chat({ isDarkMode, sessionId, onSessionUpdate }) {
     setLoadingSession(true);
     try {
       const session = await getSession(sid);
+      setNextBefore(session?.next_before ?? null);
       if (session && session.messages && session.messages.length > 0) {
         setMessages(session.messages);
       } else {
@@ -50,6 +59,21 @@ export default function Chat({ isDarkMode, sessionId, onSessionUpdate }) {
     }
   };
 
+  const loadEarlierMessages = async () => {
+    if (nextBefore === null || loadingEarlier) return;
+    setLoadingEarlier(true);
+    try {
+      const session = await getSession(sessionId, { before: nextBefore });
+      if (session && session.messages) {
+        skipScrollRef.current = true;
+        setMessages(prev => [...session.messages, ...prev]);
+        setNextBefore(session.next_before ?? null);
+      }
+    } finally {
+      setLoadingEarlier(false);
+    }
+  };
+
   const sendMessage = async (messageText = input) => {
     if (!messageText.trim() || loading) return;
     
@@ -117,6 +141,21 @@ export default function Chat({ isDarkMode, sessionId, onSessionUpdate }) {
       <div className={`flex-1 overflow-y-auto p-4 md:p-8 space-y-8 custom-scrollbar relative mx-auto w-full max-w-5xl ${
         isDarkMode ? 'bg-[#0f0f11]' : 'bg-transparent'
       }`}>
+        {nextBefore !== null && (
+          <div className="flex justify-center">
+            <button
+              onClick={loadEarlierMessages}
+              disabled={loadingEarlier}
+              className={`px-4 py-1.5 text-sm rounded-full transition-colors ${
+                isDarkMode
+                  ? 'text-gray-400 hover:text-gray-200 border border-white/10'
+                  : 'text-gray-500 hover:text-gray-700 border border-gray-200'
+              }`}
+            >
+              {loadingEarlier ? "Loading..." : "Load earlier messages"}
+            </button>
+          </div>
+        )}
         {messages.map((message, index) => (
           <div
             key={index}
@@ -44,6 +44,13 @@ export const askQuestion = async (question, sessionId = null) => {
     });
     return response.data;
   } catch (error) {
+    if (error.response?.status === 429) {
+      const data = error.response.data;
+      return {
+        answer: data.answer ? `${data.answer}\n\n_${data.detail}_` : `As-salamu alaykum. ${data.detail}`,
+        session_id: sessionId
+      };
+    }
     console.error("Backend error:", error);
     return {
       answer: "As-salamu alaykum. I apologize, but I'm having trouble connecting. Please try again later.",
@@ -63,9 +70,13 @@ export const getSessions = async () => {
   }
 };
 
-export const getSession = async (sessionId) => {
+// Returns the latest page of messages; pass `before` (the previous page's
+// next_before cursor) to fetch older messages.
+export const getSession = async (sessionId, { before = null, limit = 50 } = {}) => {
   try {
-    const response = await api.get(`/sessions/${sessionId}`);
+    const params = { limit };
+    if (before !== null) params.before = before;
+    const response = await api.get(`/sessions/${sessionId}`, { params });
     return response.data;
   } catch (error) {
     console.error("Error fetching session:", error);
@@ -73,6 +84,16 @@ export const getSession = async (sessionId) => {
   }
 };
 
+export const searchSessions = async (query, limit = 20) => {
+  try {
+    const response = await api.get('/sessions/search', { params: { q: query, limit } });
+    return response.data.results || [];
+  } catch (error) {
+    console.error("Error searching sessions:", error);
+    return [];
+  }
+};
+
 export const createNewSession = async () => {
   try {
     const response = await api.post('/sessions/new');
@@ -161,4 +182,10 @@ export const uploadProfilePicture = async (file) => {
   }
 };
 
+// Uploaded pictures have downscaled variants; ask for one at least `size` pixels wide
+export const avatarUrl = (picture, size) => {
+  if (!picture || !picture.includes('/api/profile/picture/')) return picture;
+  return `${picture}${picture.includes('?') ? '&' : '?'}size=${size}`;
+};
+
 export default api;
\ No newline at end of file
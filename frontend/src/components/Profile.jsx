@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { createPortal } from 'react-dom';
-import { getUserProfile, getUserStats, updateProfile, uploadProfilePicture } from '../api';
+import { getUserProfile, getUserStats, updateProfile, uploadProfilePicture, avatarUrl } from '../api';
 
 export default function Profile({ isDarkMode, onClose, onUpdate }) {
   const [profile, setProfile] = useState(null);
@@ -148,7 +148,7 @@ export default function Profile({ isDarkMode, onClose, onUpdate }) {
               <div className="flex flex-col items-center mb-6">
                 <div className="relative">
                   <img
-                    src={profile?.picture || `https://ui-avatars.com/api/?name=${encodeURIComponent(profile?.name || 'User')}&background=10b981&color=fff&size=150`}
+                    src={avatarUrl(profile?.picture, 256) || `https://ui-avatars.com/api/?name=${encodeURIComponent(profile?.name || 'User')}&background=10b981&color=fff&size=150`}
                     alt={profile?.name}
                     className="w-32 h-32 rounded-full object-cover border-4 border-green-500"
                   />
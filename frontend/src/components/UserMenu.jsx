@@ -1,5 +1,6 @@
 import { useState, useRef, useEffect } from 'react';
 import Profile from './Profile';
+import { avatarUrl } from '../api';
 
 export default function UserMenu({ isDarkMode, user, setUser }) {
   const [isOpen, setIsOpen] = useState(false);
@@ -35,7 +36,7 @@ export default function UserMenu({ isDarkMode, user, setUser }) {
           className="flex items-center space-x-2 focus:outline-none"
         >
           <img
-            src={user?.picture || `https://ui-avatars.com/api/?name=${encodeURIComponent(user?.name || 'User')}&background=10b981&color=fff&size=32`}
+            src={avatarUrl(user?.picture, 64) || `https://ui-avatars.com/api/?name=${encodeURIComponent(user?.name || 'User')}&background=10b981&color=fff&size=32`}
             alt={user?.name}
             className="w-8 h-8 rounded-full object-cover border-2 border-green-500"
           />
@@ -56,7 +57,7 @@ export default function UserMenu({ isDarkMode, user, setUser }) {
               <div className={`p-4 border-b ${isDarkMode ? 'border-gray-700' : 'border-gray-200'}`}>
                 <div className="flex items-center space-x-3">
                   <img
-                    src={user?.picture || `https://ui-avatars.com/api/?name=${encodeURIComponent(user?.name || 'User')}&background=10b981&color=fff&size=40`}
+                    src={avatarUrl(user?.picture, 80) || `https://ui-avatars.com/api/?name=${encodeURIComponent(user?.name || 'User')}&background=10b981&color=fff&size=40`}
                     alt={user?.name}
                     className="w-10 h-10 rounded-full object-cover"
                   />